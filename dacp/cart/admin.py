@@ -13,16 +13,23 @@ class CartItemInline(admin.TabularInline):
 class CartAdmin(admin.ModelAdmin):
     list_display = (
         "session_key",
+        "user",
         "total_items",
         "subtotal",
         "created_at",
         "updated_at",
     )
     list_filter = ("created_at", "updated_at")
-    search_fields = ("session_key",)
+    search_fields = ("session_key", "user__email")
+    raw_id_fields = ("user",)
     inlines = [CartItemInline]
     readonly_fields = ("total_items", "subtotal")
 
+    # Після правок товарів в інлайні перераховуємо підсумки
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.refresh_totals()
+
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
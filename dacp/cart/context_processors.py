@@ -1,13 +1,11 @@
-from .models import Cart
+from django.utils.functional import SimpleLazyObject
+from .storage import get_request_cart
 
 
 def cart_processor(request):
-    if not request.session.session_key:
-        request.session.create()
-
-    cart, created = Cart.objects.get_or_create(session_key=request.session.session_key)
-
     return {
-        "cart_total_items": cart.total_items,
-        "cart_subtotal": cart.subtotal,
+        "cart_total_items": SimpleLazyObject(
+            lambda: get_request_cart(request).total_items
+        ),
+        "cart_subtotal": SimpleLazyObject(lambda: get_request_cart(request).subtotal),
     }
@@ -1,5 +1,6 @@
 from django import forms
 from django.core.validators import MaxValueValidator
+from django.db.models import F
 from .models import CartItem
 
 
@@ -11,7 +12,7 @@ class AddToCartForm(forms.Form):
         super().__init__(*args, **kwargs)
         self.product = product
         if product:
-            sizez = product.product_sizes.filter(stock__gt=0)
+            sizez = product.product_sizes.filter(stock__gt=F("reserved"))
 
             if sizez.exists():
                 self.fields["size_id"] = forms.ChoiceField(
@@ -27,6 +28,24 @@ class AddToCartForm(forms.Form):
                 )
 
 
+# Одна операція для cart/batch/: add додає кількість, update встановлює її,
+# remove прибирає розмір з кошика
+class CartOperationForm(forms.Form):
+    op = forms.ChoiceField(choices=[(op, op) for op in ("add", "update", "remove")])
+    size_id = forms.IntegerField(min_value=1)
+    quantity = forms.IntegerField(min_value=0, required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        op = cleaned_data.get("op")
+        quantity = cleaned_data.get("quantity")
+        if op == "add" and not quantity:
+            self.add_error("quantity", "Add needs a quantity of at least 1.")
+        if op == "update" and quantity is None:
+            self.add_error("quantity", "Update needs a quantity.")
+        return cleaned_data
+
+
 class UpdateCartItemForm(forms.ModelForm):
     class Meta:
         model = CartItem
@@ -37,5 +56,5 @@ class UpdateCartItemForm(forms.ModelForm):
         if self.instance and self.instance.product_size:
             # Додаємо валідатор автоматично
             self.fields["quantity"].validators.append(
-                MaxValueValidator(self.instance.product_size.stock)
+                MaxValueValidator(self.instance.product_size.available)
             )
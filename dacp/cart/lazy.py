@@ -0,0 +1,125 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from .models import Cart, CartItem
+
+
+class LazyCart:
+    # Кошик поточного запиту. Читання не створюють ні сесії, ні рядка Cart:
+    # поки кошика немає, він порожній, а створюється лише при першому записі
+    def __init__(self, request):
+        self.request = request
+        self._cart = None
+        self._loaded = False
+
+    @property
+    def cart(self):
+        if not self._loaded:
+            self._loaded = True
+            user = self.request.user
+            if user.is_authenticated:
+                self._cart = self._user_cart(user)
+            elif self.request.session.session_key:
+                self._cart = Cart.objects.filter(
+                    session_key=self.request.session.session_key
+                ).first()
+        return self._cart
+
+    # Кошик користувача, а якщо його ще немає — кошик за ключем поточної сесії.
+    # Сесії, які увійшли до прив'язки кошиків до користувачів, мають лише такий.
+    # Обидва варіанти одним запитом; знайдений кошик сесії переходить до користувача
+    def _user_cart(self, user):
+        condition = Q(user=user)
+        session_key = self.request.session.session_key
+        if session_key:
+            condition |= Q(session_key=session_key, user__isnull=True)
+        cart = (
+            Cart.objects.filter(condition)
+            .order_by(F("user_id").asc(nulls_last=True))
+            .first()
+        )
+        if cart is None or cart.user_id is not None:
+            return cart
+        try:
+            with transaction.atomic():
+                Cart.objects.filter(pk=cart.pk, user__isnull=True).update(
+                    user=user, session_key=None
+                )
+        except IntegrityError:
+            # Паралельний запит уже створив кошик користувача
+            return Cart.objects.filter(user=user).first()
+        cart.user, cart.session_key = user, None
+        return cart
+
+    def get_or_create(self):
+        if self.cart is not None:
+            return self._cart
+
+        # Кошик користувача не залежить від сесії і переживає зміну ключа при вході
+        user = self.request.user
+        if user.is_authenticated:
+            self._cart, created = Cart.objects.get_or_create(user=user)
+            return self._cart
+
+        session = self.request.session
+        # Звернення до даних завантажує сесію і скидає прострочений ключ
+        session.get("cart_id")
+        if not session.session_key:
+            session.create()
+
+        self._cart, created = Cart.objects.get_or_create(
+            session_key=session.session_key
+        )
+        if created:
+            session["cart_id"] = self._cart.id
+        return self._cart
+
+    @property
+    def id(self):
+        return self.cart.id if self.cart else None
+
+    @property
+    def items(self):
+        if self.cart is None:
+            return CartItem.objects.none()
+        return self.cart.items
+
+    def get_items(self):
+        if self.cart is None:
+            return []
+        return self.cart.get_items()
+
+    def get_item(self, item_id):
+        if self.cart is None:
+            return None
+        return self.cart.get_item(item_id)
+
+    def get_quantity(self, product_size):
+        if self.cart is None:
+            return 0
+        return self.cart.get_quantity(product_size)
+
+    def update_item_quantity(self, item_id, quantity):
+        if self.cart is None:
+            return False
+        return self.cart.update_item_quantity(item_id, quantity)
+
+    def remove_item(self, item_id):
+        if self.cart is None:
+            return False
+        return self.cart.remove_item(item_id)
+
+    @property
+    def total_items(self):
+        return self.cart.total_items if self.cart else 0
+
+    @property
+    def subtotal(self):
+        return self.cart.subtotal if self.cart else 0
+
+    def refresh_totals(self):
+        if self.cart is not None:
+            self.cart.refresh_totals()
+
+    def clear(self):
+        if self.cart is not None:
+            self.cart.clear()
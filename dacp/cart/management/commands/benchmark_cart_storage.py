@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from cart.storage import CART_STORAGES
+from main.models import ProductSize
+
+
+class Command(BaseCommand):
+    help = "Compares cart storage backends: time and DB queries per add and per read."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", action="append", choices=sorted(CART_STORAGES))
+        parser.add_argument("--iterations", type=int, default=50)
+
+    def handle(self, *args, **options):
+        sizes = list(
+            ProductSize.objects.filter(stock__gt=0).select_related("product")[:5]
+        )
+        if not sizes:
+            raise CommandError("No product sizes in stock to put into a cart")
+
+        for backend in options["backend"] or sorted(CART_STORAGES):
+            with override_settings(CART_STORAGE=backend):
+                adds, reads = self.run_backend(sizes, options["iterations"])
+            for name, (seconds, queries, count) in (("add", adds), ("read", reads)):
+                self.stdout.write(
+                    f"{backend:>6} {name:<4} "
+                    f"{seconds / count * 1000:8.2f} ms/op "
+                    f"{queries / count:6.2f} queries/op"
+                )
+
+    def run_backend(self, sizes, iterations):
+        host = (settings.ALLOWED_HOSTS or ["localhost"])[0].lstrip(".")
+        client = Client(HTTP_HOST=host)
+        adds = [0.0, 0, 0]
+        reads = [0.0, 0, 0]
+
+        # Кошики, створені під час заміру, відкочуємо
+        with transaction.atomic():
+            for index in range(iterations):
+                size = sizes[index % len(sizes)]
+                # Кожен розмір додаємо по одному разу, щоб не впертись у залишок
+                if index and size is sizes[0]:
+                    client.post("/cart/clear/")
+                self.measure(
+                    adds,
+                    client.post,
+                    f"/cart/add/{size.product.slug}/",
+                    {"size_id": size.id, "quantity": 1},
+                )
+                self.measure(reads, client.get, "/cart/count/")
+            client.post("/cart/clear/")
+            transaction.set_rollback(True)
+        return adds, reads
+
+    def measure(self, totals, method, *args):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            method(*args)
+            totals[0] += time.perf_counter() - started
+        totals[1] += len(queries)
+        totals[2] += 1
@@ -0,0 +1,76 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from cart.models import Cart
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes anonymous carts idle for longer than CART_IDLE_DAYS and expired "
+        "database sessions in small primary-key batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.CART_IDLE_DAYS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between batches.",
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options["batch_size"]
+        self.pause = options["pause"]
+
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        carts = self.purge(
+            "carts",
+            Cart.objects.filter(user__isnull=True, updated_at__lt=cutoff),
+        )
+        sessions = self.purge(
+            "sessions",
+            Session.objects.filter(expire_date__lt=timezone.now()),
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {carts} idle anonymous carts and {sessions} expired sessions"
+            )
+        )
+
+    def purge(self, label, queryset):
+        # Кожна пачка — окрема коротка транзакція, тож блокування не тримаються довго.
+        # Умову повторюємо в DELETE: кошик могли оновити, поки ми вибирали пачку
+        last_pk = None
+        deleted = 0
+        batch = 0
+
+        while True:
+            pending = queryset.order_by("pk")
+            if last_pk is not None:
+                pending = pending.filter(pk__gt=last_pk)
+            pks = list(pending.values_list("pk", flat=True)[: self.batch_size])
+            if not pks:
+                break
+
+            started = time.monotonic()
+            with transaction.atomic():
+                rows, per_model = queryset.filter(pk__in=pks).delete()
+            batch += 1
+            deleted += per_model.get(queryset.model._meta.label, 0)
+            last_pk = pks[-1]
+            self.stdout.write(
+                f"{label} batch {batch}: {rows} rows in "
+                f"{time.monotonic() - started:.3f}s"
+            )
+            if self.pause:
+                time.sleep(self.pause)
+
+        return deleted
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from cart.models import Cart
+
+
+class Command(BaseCommand):
+    help = "Recomputes the stored total_items/subtotal of carts in primary-key batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = 0
+        total = 0
+        repaired = 0
+
+        while True:
+            carts = list(
+                Cart.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", "total_items", "subtotal")[:batch_size]
+            )
+            if not carts:
+                break
+            ids = [pk for pk, _, _ in carts]
+            with transaction.atomic():
+                Cart.objects.filter(pk__in=ids).refresh_totals()
+                fixed = {
+                    pk: (total_items, subtotal)
+                    for pk, total_items, subtotal in Cart.objects.filter(
+                        pk__in=ids
+                    ).values_list("pk", "total_items", "subtotal")
+                }
+            repaired += sum(
+                1
+                for pk, total_items, subtotal in carts
+                if fixed.get(pk) != (total_items, subtotal)
+            )
+            total += len(carts)
+            last_id = ids[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked {total} carts, repaired {repaired}")
+        )
@@ -1,13 +1,19 @@
 from django.utils.deprecation import MiddlewareMixin
-from .models import Cart
+from django.utils.functional import SimpleLazyObject
+from .storage import get_cart_storage
 
 
 class CartMiddleware(MiddlewareMixin):
     def process_request(self, request):
-        if not request.session.session_key:
-            request.session.create()
-
-        request.cart, created = Cart.objects.get_or_create(
-            session_key=request.session.session_key
-        )
+        # Без запитів до бази: сховище і кошик завантажуються при першому зверненні.
+        # Це єдиний кошик запиту, його ж беруть контекст-процесор, тег і CartMixin
+        request.cart_storage = get_cart_storage(request)
+        request.cart = SimpleLazyObject(request.cart_storage.get_cart)
         return None
+
+    def process_response(self, request, response):
+        # Cookie-сховища записують свої cookie у відповідь
+        storage = getattr(request, "cart_storage", None)
+        if storage is not None:
+            response = storage.process_response(response)
+        return response
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0002_cart_totals"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cart",
+            index=models.Index(fields=["updated_at"], name="cart_updated_idx"),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Копії кошиків кеш-сховища зберігались під session_key "user:<id>"
+def link_persisted_carts(apps, schema_editor):
+    Cart = apps.get_model("cart", "Cart")
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    carts = Cart.objects.filter(session_key__startswith="user:")
+    for cart in carts:
+        user_id = cart.session_key.split(":", 1)[1]
+        if user_id.isdigit() and User.objects.filter(pk=user_id).exists():
+            cart.user_id = int(user_id)
+            cart.session_key = None
+            cart.save(update_fields=["user", "session_key"])
+        else:
+            cart.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0003_cart_updated_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="user",
+            field=models.OneToOneField(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="cart",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="cart",
+            name="session_key",
+            field=models.CharField(blank=True, max_length=40, null=True, unique=True),
+        ),
+        migrations.RunPython(link_persisted_carts, migrations.RunPython.noop),
+    ]
@@ -1,26 +1,207 @@
-from django.db import models
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.sessions.models import Session
+from django.utils import timezone
 from main.models import Product, ProductSize
 from decimal import Decimal
 
 # Create your models here.
 
 
+# Підсумок add_by_slug. product_size_id None — розмір не знайдено,
+# item_id None — товар не додано, бо не вистачає залишку
+AddResult = namedtuple(
+    "AddResult",
+    [
+        "product_name",
+        "product_size_id",
+        "available",
+        "in_cart",
+        "item_id",
+        "quantity",
+        "total_items",
+        "subtotal",
+    ],
+)
+
+# Перевірка розміру, upsert рядка з перевіркою вільного залишку (stock - reserved)
+# і оновлення підсумків
+# одним запитом. Паралельні кліки впираються в ON CONFLICT, а не в IntegrityError
+ADD_BY_SLUG_SQL = """
+WITH product AS (
+    SELECT id, name, price FROM main_product WHERE slug = %(slug)s
+),
+size AS (
+    SELECT ps.id, ps.product_id, ps.stock - ps.reserved AS available
+    FROM main_productsize ps
+    JOIN product ON ps.product_id = product.id
+    WHERE CASE
+        WHEN %(size_id)s::integer IS NULL THEN ps.stock > ps.reserved
+        ELSE ps.id = %(size_id)s::integer
+    END
+    ORDER BY ps.id
+    LIMIT 1
+),
+current AS (
+    SELECT quantity FROM cart_cartitem
+    WHERE cart_id = %(cart_id)s AND product_size_id = (SELECT id FROM size)
+),
+item AS (
+    INSERT INTO cart_cartitem (cart_id, product_id, product_size_id, quantity, added_at)
+    SELECT %(cart_id)s, size.product_id, size.id, %(quantity)s, now()
+    FROM size
+    WHERE size.available >= %(quantity)s
+    ON CONFLICT (cart_id, product_id, product_size_id) DO UPDATE
+    SET quantity = cart_cartitem.quantity + EXCLUDED.quantity
+    WHERE cart_cartitem.quantity + EXCLUDED.quantity <= (
+        SELECT stock - reserved FROM main_productsize
+        WHERE id = EXCLUDED.product_size_id
+    )
+    RETURNING id, quantity
+),
+totals AS (
+    UPDATE cart_cart
+    SET total_items = total_items + %(quantity)s,
+        subtotal = subtotal + %(quantity)s * (SELECT price FROM product),
+        updated_at = now()
+    WHERE id = %(cart_id)s AND EXISTS (SELECT 1 FROM item)
+    RETURNING total_items, subtotal
+)
+SELECT
+    product.name,
+    size.id,
+    size.available,
+    COALESCE((SELECT quantity FROM current), 0),
+    item.id,
+    item.quantity,
+    totals.total_items,
+    totals.subtotal
+FROM product
+LEFT JOIN size ON true
+LEFT JOIN item ON true
+LEFT JOIN totals ON true
+"""
+
+
+# Злиття рядків у кошик користувача одним upsert; кількість не перевищує
+# вільного залишку (stock - reserved)
+MERGE_LINES_SQL = """
+INSERT INTO cart_cartitem (cart_id, product_id, product_size_id, quantity, added_at)
+SELECT %(cart_id)s, ps.product_id, ps.id,
+    LEAST(line.quantity, ps.stock - ps.reserved), now()
+FROM unnest(%(size_ids)s::integer[], %(quantities)s::integer[])
+    AS line(size_id, quantity)
+JOIN main_productsize ps ON ps.id = line.size_id
+WHERE ps.stock > ps.reserved
+ON CONFLICT (cart_id, product_id, product_size_id) DO UPDATE
+SET quantity = LEAST(
+    cart_cartitem.quantity + EXCLUDED.quantity,
+    (
+        SELECT stock - reserved FROM main_productsize
+        WHERE id = EXCLUDED.product_size_id
+    )
+)
+"""
+
+
+class CartQuerySet(models.QuerySet):
+    # Перераховує підсумки вибраних кошиків одним UPDATE з підзапитами до CartItem
+    def refresh_totals(self):
+        items = CartItem.objects.filter(cart=OuterRef("pk")).order_by().values("cart")
+        return self.update(
+            total_items=Coalesce(
+                Subquery(items.annotate(total=Sum("quantity")).values("total")), 0
+            ),
+            subtotal=Coalesce(
+                Subquery(
+                    items.annotate(
+                        total=Sum(F("quantity") * F("product__price"))
+                    ).values("total")
+                ),
+                Value(Decimal("0")),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+            updated_at=timezone.now(),
+        )
+
+    # lines: {id розміру: кількість}. Повертає кошик користувача з новими підсумками
+    def merge_into_user(self, user, lines):
+        cart, created = self.get_or_create(user=user)
+        if lines:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    MERGE_LINES_SQL,
+                    {
+                        "cart_id": cart.pk,
+                        "size_ids": list(lines),
+                        "quantities": list(lines.values()),
+                    },
+                )
+            cart.refresh_totals()
+        return cart
+
+
 class Cart(models.Model):
-    session_key = models.CharField(max_length=40, unique=True)
+    # Анонімний кошик прив'язаний до сесії, кошик користувача — до користувача
+    session_key = models.CharField(max_length=40, unique=True, null=True, blank=True)
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="cart",
+    )
+    # Підсумки зберігаються в рядку кошика, щоб лічильник у шапці не рахував товари
+    total_items = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        # Для purge_carts: пошук кошиків, що давно не змінювались
+        indexes = [models.Index(fields=["updated_at"], name="cart_updated_idx")]
+
     def __str__(self):
-        return f"Cart {self.session_key}"
+        return f"Cart {self.session_key or self.user_id}"
 
-    @property
-    def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+    # Викликається після кожної зміни товарів у кошику
+    def refresh_totals(self):
+        Cart.objects.filter(pk=self.pk).refresh_totals()
+        self.refresh_from_db(fields=["total_items", "subtotal", "updated_at"])
+        self._items_snapshot = None
 
-    @property
-    def subtotal(self):
-        return sum(item.total_price for item in self.items.all())
+    # Спільне API з кошиками поза базою (cart/storage.py).
+    # Рядки читаються один раз на екземпляр (тобто на запит) і скидаються при змінах
+    def get_items(self):
+        if getattr(self, "_items_snapshot", None) is None:
+            self._items_snapshot = list(
+                # id розводить рядки з однаковим added_at (now() однаковий у транзакції)
+                self.items.select_related("product", "product_size__size").order_by(
+                    "-added_at", "-id"
+                )
+            )
+        return self._items_snapshot
+
+    def get_item(self, item_id):
+        return (
+            self.items.select_related("product", "product_size__size")
+            .filter(id=item_id)
+            .first()
+        )
+
+    def get_quantity(self, product_size):
+        quantity = (
+            self.items.filter(product_size=product_size)
+            .values_list("quantity", flat=True)
+            .first()
+        )
+        return quantity or 0
 
     def add_product(self, product, size, quantity=1):
         cart_item, created = CartItem.objects.get_or_create(
@@ -33,12 +214,67 @@ class Cart(models.Model):
         if not created:
             cart_item.quantity += quantity
             cart_item.save()
+        self.refresh_totals()
         return cart_item
 
+    # Для cart/batch/: кількості вибраних розмірів, рядки блокуються до кінця транзакції
+    def get_quantities(self, size_ids):
+        return dict(
+            self.items.select_for_update()
+            .filter(product_size_id__in=size_ids)
+            .values_list("product_size_id", "quantity")
+        )
+
+    # quantities: {id розміру: нова кількість}, 0 — прибрати з кошика.
+    # Одне видалення, один upsert і один перерахунок підсумків
+    def set_quantities(self, quantities, product_ids):
+        removed = [pk for pk, quantity in quantities.items() if not quantity]
+        if removed:
+            self.items.filter(product_size_id__in=removed).delete()
+        CartItem.objects.bulk_create(
+            [
+                CartItem(
+                    cart=self,
+                    product_id=product_ids[pk],
+                    product_size_id=pk,
+                    quantity=quantity,
+                )
+                for pk, quantity in quantities.items()
+                if quantity
+            ],
+            update_conflicts=True,
+            unique_fields=["cart", "product", "product_size"],
+            update_fields=["quantity"],
+        )
+        self.refresh_totals()
+
+    # size_id None — перший розмір, що є в наявності. None, якщо товару немає
+    def add_by_slug(self, slug, size_id, quantity=1):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                ADD_BY_SLUG_SQL,
+                {
+                    "slug": slug,
+                    "size_id": size_id,
+                    "cart_id": self.pk,
+                    "quantity": quantity,
+                },
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        result = AddResult(*row)
+        if result.item_id is not None:
+            self.total_items = result.total_items
+            self.subtotal = result.subtotal
+            self._items_snapshot = None
+        return result
+
     def remove_item(self, item_id):
         try:
             item = self.items.get(id=item_id)
             item.delete()
+            self.refresh_totals()
             return True
         except CartItem.DoesNotExist:
             return False  # Якщо товару не існує, для виводу помилки
@@ -51,12 +287,14 @@ class Cart(models.Model):
                 item.save()
             else:
                 item.delete()
+            self.refresh_totals()
             return True
         except CartItem.DoesNotExist:
             return False
 
     def clear(self):
         self.items.all().delete()
+        self.refresh_totals()
 
 
 # CartItem модель що допомагає співставляти ключ сесіїї з ключом корзини(клієнта)
@@ -0,0 +1,42 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from main.models import Product, ProductSize
+from .models import Cart
+from .storage import get_cart_storage
+
+
+# Підсумок кошика рахується за поточною ціною товару
+@receiver(post_save, sender=Product)
+def refresh_cart_prices(sender, instance, created, **kwargs):
+    if not created:
+        Cart.objects.filter(items__product=instance).refresh_totals()
+
+
+# Рядки кошика видаляються каскадом, тому кошики запам'ятовуємо заздалегідь
+@receiver(pre_delete, sender=Product)
+@receiver(pre_delete, sender=ProductSize)
+def remember_carts(sender, instance, **kwargs):
+    lookup = "items__product" if sender is Product else "items__product_size"
+    instance._cart_ids = list(
+        Cart.objects.filter(**{lookup: instance}).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductSize)
+def refresh_carts_after_delete(sender, instance, **kwargs):
+    cart_ids = getattr(instance, "_cart_ids", None)
+    if cart_ids:
+        Cart.objects.filter(pk__in=cart_ids).refresh_totals()
+
+
+# Анонімний кошик переходить у кошик користувача, а не лишається осиротілим
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    if request is None:
+        return
+    storage = getattr(request, "cart_storage", None)
+    if storage is None:
+        storage = request.cart_storage = get_cart_storage(request)
+    storage.merge_on_login(user)
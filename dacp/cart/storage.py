@@ -0,0 +1,435 @@
+import atexit
+import logging
+import secrets
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from main.models import Product, ProductSize
+from .lazy import LazyCart
+from .models import AddResult, Cart, CartItem
+
+logger = logging.getLogger(__name__)
+
+
+class CartFull(Exception):
+    pass
+
+
+# Рядок кошика поза базою. id рядка — це id ProductSize
+class CartLine:
+    def __init__(self, product_size, quantity):
+        self.id = product_size.id
+        self.product_size = product_size
+        self.product = product_size.product
+        self.quantity = quantity
+
+    @property
+    def total_price(self):
+        return Decimal(str(self.product.price)) * self.quantity
+
+
+# Кошик у кеші або cookie: {id ProductSize: кількість} плюс підсумки,
+# щоб лічильник у шапці не ходив у базу. API таке ж, як у моделі Cart
+class StoredCart:
+    id = None
+
+    def __init__(self, storage, data):
+        self.storage = storage
+        self.lines = {int(pk): quantity for pk, quantity in data.get("lines", [])}
+        self.total_items = data.get("total_items", 0)
+        self.subtotal = Decimal(data.get("subtotal", "0"))
+        self._items = None
+
+    def to_data(self):
+        return {
+            "lines": [[pk, quantity] for pk, quantity in self.lines.items()],
+            "total_items": self.total_items,
+            "subtotal": str(self.subtotal),
+        }
+
+    def get_items(self):
+        if self._items is None:
+            sizes = ProductSize.objects.select_related("product", "size").in_bulk(
+                list(self.lines)
+            )
+            # Нові товари зверху, як у кошику в базі
+            self._items = [
+                CartLine(sizes[pk], quantity)
+                for pk, quantity in reversed(self.lines.items())
+                if pk in sizes
+            ]
+        return self._items
+
+    def get_item(self, item_id):
+        if item_id not in self.lines:
+            return None
+        product_size = (
+            ProductSize.objects.select_related("product", "size")
+            .filter(pk=item_id)
+            .first()
+        )
+        if product_size is None:
+            return None
+        return CartLine(product_size, self.lines[item_id])
+
+    def get_quantity(self, product_size):
+        return self.lines.get(product_size.id, 0)
+
+    def add_product(self, product, size, quantity=1):
+        self.lines[size.id] = self.lines.pop(size.id, 0) + quantity
+        self.refresh_totals()
+        return CartLine(size, self.lines[size.id])
+
+    def add_by_slug(self, slug, size_id, quantity=1):
+        sizes = ProductSize.objects.select_related("product").filter(product__slug=slug)
+        if size_id:
+            sizes = sizes.filter(pk=size_id)
+        else:
+            sizes = sizes.filter(stock__gt=F("reserved")).order_by("pk")
+        product_size = sizes.first()
+
+        if product_size is None:
+            name = Product.objects.filter(slug=slug).values_list("name", flat=True)
+            name = name.first()
+            if name is None:
+                return None
+            return AddResult(name, None, 0, 0, None, 0, None, None)
+
+        in_cart = self.get_quantity(product_size)
+        result = AddResult(
+            product_size.product.name,
+            product_size.id,
+            product_size.available,
+            in_cart,
+            None,
+            in_cart,
+            None,
+            None,
+        )
+        if in_cart + quantity > product_size.available:
+            return result
+        line = self.add_product(product_size.product, product_size, quantity)
+        return result._replace(
+            item_id=line.id,
+            quantity=line.quantity,
+            total_items=self.total_items,
+            subtotal=self.subtotal,
+        )
+
+    def get_quantities(self, size_ids):
+        return {pk: self.lines[pk] for pk in size_ids if pk in self.lines}
+
+    def set_quantities(self, quantities, product_ids):
+        for pk, quantity in quantities.items():
+            if quantity:
+                self.lines[pk] = quantity
+            else:
+                self.lines.pop(pk, None)
+        self.refresh_totals()
+
+    def update_item_quantity(self, item_id, quantity):
+        if item_id not in self.lines:
+            return False
+        if quantity > 0:
+            self.lines[item_id] = quantity
+        else:
+            del self.lines[item_id]
+        self.refresh_totals()
+        return True
+
+    def remove_item(self, item_id):
+        if self.lines.pop(item_id, None) is None:
+            return False
+        self.refresh_totals()
+        return True
+
+    def clear(self):
+        self.lines = {}
+        self.refresh_totals()
+
+    def refresh_totals(self):
+        prices = dict(
+            ProductSize.objects.filter(pk__in=list(self.lines)).values_list(
+                "pk", "product__price"
+            )
+        )
+        # Розміри, яких вже немає в базі, просто випадають з кошика
+        self.lines = {pk: qty for pk, qty in self.lines.items() if pk in prices}
+        self._items = None
+        self.total_items = sum(self.lines.values())
+        self.subtotal = sum(
+            (prices[pk] * qty for pk, qty in self.lines.items()), Decimal("0")
+        )
+        self.storage.save(self)
+
+
+class DatabaseCartStorage:
+    def __init__(self, request):
+        self.request = request
+        self.cart = None
+
+    def get_cart(self, create=False):
+        if self.cart is None:
+            self.cart = LazyCart(self.request)
+        if create:
+            return self.cart.get_or_create()
+        return self.cart
+
+    def merge_on_login(self, user):
+        # login() вже змінив ключ сесії, але дані сесії, разом з cart_id, збереглись
+        cart_id = self.request.session.pop("cart_id", None)
+        self.cart = None
+        anonymous = Cart.objects.filter(pk=cart_id, user__isnull=True).first()
+        if anonymous is None:
+            return
+        lines = dict(anonymous.items.values_list("product_size_id", "quantity"))
+        Cart.objects.merge_into_user(user, lines)
+        anonymous.delete()
+
+    def process_response(self, response):
+        return response
+
+
+class CookieCartStorage:
+    COOKIE_NAME = "cart"
+    SALT = "cart.storage.cookie"
+    # Cookie обмежений ~4 КБ, тож тут живуть лише невеликі анонімні кошики
+    MAX_LINES = 20
+
+    def __init__(self, request):
+        self.request = request
+        self.cart = None
+        self.modified = False
+        self.database = DatabaseCartStorage(request)
+
+    def get_cart(self, create=False):
+        # Кошики користувачів лишаються в базі
+        if self.request.user.is_authenticated:
+            return self.database.get_cart(create)
+        if self.cart is None:
+            self.cart = StoredCart(self, self.load())
+        return self.cart
+
+    def load(self):
+        raw = self.request.COOKIES.get(self.COOKIE_NAME)
+        if raw:
+            try:
+                return signing.loads(
+                    raw, salt=self.SALT, max_age=settings.SESSION_COOKIE_AGE
+                )
+            except signing.BadSignature:
+                pass
+        return {}
+
+    def merge_on_login(self, user):
+        lines = StoredCart(self, self.load()).lines
+        if lines:
+            Cart.objects.merge_into_user(user, lines)
+            # Порожній кошик змушує process_response видалити cookie
+            self.cart = StoredCart(self, {})
+            self.modified = True
+        self.database.merge_on_login(user)
+
+    def save(self, cart):
+        if len(cart.lines) > self.MAX_LINES:
+            raise CartFull(f"A cart can hold at most {self.MAX_LINES} different items")
+        self.modified = True
+
+    def process_response(self, response):
+        if not self.modified:
+            return response
+        if self.cart.lines:
+            response.set_cookie(
+                self.COOKIE_NAME,
+                signing.dumps(self.cart.to_data(), salt=self.SALT, compress=True),
+                max_age=settings.SESSION_COOKIE_AGE,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite="Lax",
+            )
+        else:
+            response.delete_cookie(self.COOKIE_NAME, samesite="Lax")
+        return response
+
+
+class CacheCartStorage:
+    COOKIE_NAME = "cart_token"
+
+    def __init__(self, request):
+        self.request = request
+        self.cart = None
+        self.new_token = None
+
+    def cache_key(self):
+        user = self.request.user
+        if user.is_authenticated:
+            return f"cart:user:{user.pk}"
+        return self.anonymous_key()
+
+    def anonymous_key(self):
+        token = self.new_token or self.request.COOKIES.get(self.COOKIE_NAME)
+        return f"cart:anon:{token}" if token else None
+
+    def get_cart(self, create=False):
+        if self.cart is None:
+            key = self.cache_key()
+            data = cache.get(key) if key else None
+            user = self.request.user
+            # Якщо кеш втратив кошик користувача, беремо збережену в базі копію
+            if data is None and user.is_authenticated and settings.CART_WRITE_BEHIND:
+                data = load_persisted_cart(user.pk)
+            self.cart = StoredCart(self, data or {})
+        return self.cart
+
+    def merge_on_login(self, user):
+        key = self.anonymous_key()
+        data = cache.get(key) if key else None
+        self.cart = None
+        if not data:
+            return
+        # Кількості з анонімного кошика додаються до кошика користувача в межах
+        # вільного залишку
+        cart = self.get_cart()
+        lines = StoredCart(self, data).lines
+        available = {
+            size.pk: size.available
+            for size in ProductSize.objects.filter(pk__in=list(lines))
+        }
+        for pk, quantity in lines.items():
+            if available.get(pk):
+                cart.lines[pk] = min(cart.lines.get(pk, 0) + quantity, available[pk])
+        cart.refresh_totals()
+        cache.delete(key)
+
+    def save(self, cart):
+        key = self.cache_key()
+        if key is None:
+            self.new_token = secrets.token_urlsafe(24)
+            key = self.cache_key()
+        data = cart.to_data()
+        cache.set(key, data, settings.SESSION_COOKIE_AGE)
+
+        user = self.request.user
+        if user.is_authenticated and settings.CART_WRITE_BEHIND:
+            write_behind.schedule(user.pk, data)
+
+    def process_response(self, response):
+        if self.new_token:
+            response.set_cookie(
+                self.COOKIE_NAME,
+                self.new_token,
+                max_age=settings.SESSION_COOKIE_AGE,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+CART_STORAGES = {
+    "db": DatabaseCartStorage,
+    "cache": CacheCartStorage,
+    "cookie": CookieCartStorage,
+}
+
+
+def get_cart_storage(request, backend=None):
+    return CART_STORAGES[backend or settings.CART_STORAGE](request)
+
+
+def get_request_cart(request, create=False):
+    storage = getattr(request, "cart_storage", None)
+    if storage is None:
+        storage = request.cart_storage = get_cart_storage(request)
+    return storage.get_cart(create)
+
+
+# Копія кошика користувача в базі для кеш-сховища
+def load_persisted_cart(user_id):
+    cart = Cart.objects.filter(user_id=user_id).first()
+    if cart is None:
+        return None
+    # Порядок дзеркальний до Cart.get_items: кошик поза базою показує рядки з кінця
+    lines = cart.items.order_by("added_at", "id").values_list(
+        "product_size_id", "quantity"
+    )
+    return {
+        "lines": [list(line) for line in lines],
+        "total_items": cart.total_items,
+        "subtotal": str(cart.subtotal),
+    }
+
+
+def persist_cart(user_id, data):
+    lines = {int(pk): quantity for pk, quantity in data["lines"]}
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(user_id=user_id)
+        cart.items.exclude(product_size_id__in=list(lines)).delete()
+        product_ids = dict(
+            ProductSize.objects.filter(pk__in=list(lines)).values_list(
+                "pk", "product_id"
+            )
+        )
+        CartItem.objects.bulk_create(
+            [
+                CartItem(
+                    cart=cart,
+                    product_id=product_ids[pk],
+                    product_size_id=pk,
+                    quantity=quantity,
+                )
+                for pk, quantity in lines.items()
+                if pk in product_ids
+            ],
+            update_conflicts=True,
+            unique_fields=["cart", "product", "product_size"],
+            update_fields=["quantity"],
+        )
+        Cart.objects.filter(pk=cart.pk).refresh_totals()
+
+
+class WriteBehindQueue:
+    # Зміни кошиків користувачів накопичуються в пам'яті воркера і пишуться
+    # в базу у фоновому потоці: кілька змін одного кошика дають один запис
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def schedule(self, user_id, data):
+        with self._lock:
+            self._pending[user_id] = data
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Cart write-behind flush failed")
+            finally:
+                connection.close()
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for user_id, data in pending.items():
+            persist_cart(user_id, data)
+
+
+write_behind = WriteBehindQueue(settings.CART_WRITE_BEHIND_INTERVAL)
+atexit.register(write_behind.flush)
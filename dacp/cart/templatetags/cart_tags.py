@@ -1,24 +1,13 @@
 from django import template
-from cart.models import Cart
+from cart.storage import get_request_cart
 
 register = template.Library()
 
 
 @register.simple_tag(takes_context=True)
 def get_cart_count(context):
-    request = context["request"]
-
-    if hasattr(request, "cart"):
-        return request.cart.total_items
-
-    if not request.session.session_key:
-        return 0
-
-    try:
-        cart = Cart.objects.get(session_key=request.session.session_key)
-        return cart.total_items
-    except Cart.DoesNotExist:
-        return 0
+    # Підсумок зберігається в самому кошику, окремого підрахунку немає
+    return get_request_cart(context["request"]).total_items
 
 
 @register.filter
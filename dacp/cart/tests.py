@@ -1,3 +1,68 @@
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from main.models import Category, Product, ProductSize, Size
+from .models import Cart
+
+
+def cart_queries(captured):
+    return [
+        query["sql"]
+        for query in captured
+        if '"cart_cart"' in query["sql"] or '"cart_cartitem"' in query["sql"]
+    ]
+
+
+class CartSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Shirts", slug="shirts")
+        cls.product = Product.objects.create(
+            name="Shirt",
+            slug="shirt",
+            category=category,
+            color="Red",
+            price=Decimal("10.00"),
+            main_image="products/shirt.jpg",
+        )
+        cls.sizes = [
+            ProductSize.objects.create(
+                product=cls.product, size=Size.objects.create(name=name), stock=5
+            )
+            for name in ("S", "M")
+        ]
+
+    def setUp(self):
+        for product_size in self.sizes:
+            self.client.post(
+                reverse("cart:add_to_cart", args=[self.product.slug]),
+                {"size_id": product_size.id, "quantity": 1},
+            )
+
+    def test_full_page_reads_cart_once(self):
+        # Шапка (тег), контекст-процесор і middleware беруть один і той самий кошик
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse("main:about"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(cart_queries(captured)), 1)
+
+    def test_cart_modal_reads_cart_and_items_once(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse("cart:cart_modal"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["cart_items"]), 2)
+        self.assertEqual(len(cart_queries(captured)), 2)
+
+    def test_items_are_loaded_once_and_reset_on_change(self):
+        cart = Cart.objects.get()
+        with self.assertNumQueries(1):
+            items = cart.get_items()
+            cart.get_items()
+        self.assertEqual(cart.total_items, 2)
 
-# Create your tests here.
+        cart.update_item_quantity(items[0].id, 3)
+        self.assertEqual(cart.get_items()[0].quantity, 3)
+        self.assertEqual(cart.total_items, 4)
@@ -15,4 +15,5 @@ urlpatterns = [
     path("count/", views.CartCountView.as_view(), name="cart_count"),
     path("clear/", views.ClearCartView.as_view(), name="clear_cart"),
     path("summary/", views.CartSummaryView.as_view(), name="cart_summary"),
+    path("batch/", views.CartBatchView.as_view(), name="batch"),
 ]
@@ -1,26 +1,33 @@
-from django.shortcuts import get_object_or_404, redirect
+import json
+
+from django.shortcuts import redirect
 from django.views.generic import View
-from main.models import Product, ProductSize
-from .models import Cart, CartItem
-from .forms import AddToCartForm
-from django.http import JsonResponse
+from main.models import ProductSize
+from .forms import AddToCartForm, CartOperationForm
+from .storage import CartFull, get_request_cart
+from django.http import Http404, JsonResponse
 from django.template.response import TemplateResponse
 from django.db import transaction
+from django.db.models import F
 
 
 class CartMixin:
-    def get_cart(self, request):
-        if hasattr(request, "cart"):
-            return request.cart
-        if not request.session.session_key:
-            request.session.create()
-
-        cart, created = Cart.objects.get_or_create(
-            session_key=request.session.session_key
+    # Кошик з налаштованого сховища (settings.CART_STORAGE).
+    # create=True лише для записів: читання не створюють сесію і Cart
+    def get_cart(self, request, create=False):
+        return get_request_cart(request, create)
+
+    # Відповідь на зміну одного рядка: сам рядок (порожньо, якщо його прибрано)
+    # плюс лічильники й підсумок через hx-swap-oob. Решту кошика не чіпаємо
+    def render_item_update(self, request, cart, item=None):
+        if not cart.total_items:
+            response = TemplateResponse(request, "cart/cart_empty.html", {"cart": cart})
+            response["HX-Retarget"] = "#cart-content"
+            response["HX-Reswap"] = "innerHTML"
+            return response
+        return TemplateResponse(
+            request, "cart/cart_item_update.html", {"cart": cart, "item": item}
         )
-        request.session["cart_id"] = cart.id
-        request.session.modified = True
-        return cart
 
 
 class CartModalView(CartMixin, View):
@@ -28,9 +35,7 @@ class CartModalView(CartMixin, View):
         cart = self.get_cart(request)
         context = {
             "cart": cart,
-            "cart_items": cart.items.select_related(
-                "product", "product_size__size"
-            ).order_by("-added_at"),
+            "cart_items": cart.get_items(),
         }
         return TemplateResponse(request, "cart/cart_modal.html", context)
 
@@ -38,9 +43,7 @@ class CartModalView(CartMixin, View):
 class AddToCartView(CartMixin, View):
     @transaction.atomic
     def post(self, request, slug):
-        cart = self.get_cart(request)
-        product = get_object_or_404(Product, slug=slug)
-        form = AddToCartForm(request.POST, product=product)
+        form = AddToCartForm(request.POST)
 
         if not form.is_valid():
             return JsonResponse(
@@ -51,61 +54,48 @@ class AddToCartView(CartMixin, View):
                 status=400,
             )
 
-        # Логіка вbбору розміпу
+        # Розмір, залишок і вже наявна кількість перевіряються в самому запиті додавання.
+        # Без size_id береться перший розмір у наявності
         size_id = form.cleaned_data.get("size_id")
-        if size_id:
-            product_size = get_object_or_404(ProductSize, id=size_id, product=product)
-        else:
-            product_size = product.product_sizes.filter(stock__gt=0).first()
-            if not product_size:
-                return JsonResponse(
-                    {"error": "No sizes available"},
-                    status=400,
-                )
-
         quantity = form.cleaned_data["quantity"]
+        cart = self.get_cart(request, create=True)
 
-        # Перевірка товару на складі
-        if product_size.stock < quantity:
+        try:
+            result = cart.add_by_slug(slug, size_id, quantity)
+        except CartFull as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        if result is None:
+            raise Http404("Product not found")
+        if result.product_size_id is None:
+            if size_id:
+                raise Http404("Product size not found")
             return JsonResponse(
-                {"error": f"Only {product_size.stock} items available"}, status=400
+                {"error": "No sizes available"},
+                status=400,
             )
 
-        # Перевірка, чи єтовар у корзині?
-        existing_item = cart.items.filter(
-            product=product,
-            product_size=product_size,
-        ).first()
-
-        if existing_item:
-            # Якщо товар уже є, то оновлюємо кількість
-            if existing_item.quantity + quantity > product_size.stock:
+        # Перевірка товару на складі
+        if result.item_id is None:
+            if result.available < quantity:
                 return JsonResponse(
-                    {
-                        "error": f"Can't add {quantity} items. Only {product_size.stock - existing_item.quantity} more available."
-                    },
-                    status=400,
+                    {"error": f"Only {result.available} items available"}, status=400
                 )
-            existing_item.quantity += quantity
-            existing_item.save()
-            cart_item = existing_item
-        else:
-            # Якщо методу нема, або для впевненості, свторюємо напряму:
-            cart_item = CartItem.objects.create(
-                cart=cart, product=product, product_size=product_size, quantity=quantity
+            return JsonResponse(
+                {
+                    "error": f"Can't add {quantity} items. Only {result.available - result.in_cart} more available."
+                },
+                status=400,
             )
 
-        request.session["cart_id"] = cart.id
-        request.session.modified = True
-
         # завжди повератаємо JSON
         # JavaScript вирішує, чи відкривати штору
         return JsonResponse(
             {
                 "success": True,
-                "total_items": cart.total_items,
-                "message": f"{product.name} added to cart",
-                "cart_item_id": cart_item.id,
+                "total_items": result.total_items,
+                "message": f"{result.product_name} added to cart",
+                "cart_item_id": result.item_id,
             }
         )
 
@@ -114,7 +104,9 @@ class UpdateCartItemView(CartMixin, View):
     @transaction.atomic
     def post(self, request, item_id):
         cart = self.get_cart(request)
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
+        cart_item = cart.get_item(item_id)
+        if cart_item is None:
+            raise Http404("Cart item not found")
 
         try:
             quantity = int(request.POST.get("quantity", 1))
@@ -124,49 +116,27 @@ class UpdateCartItemView(CartMixin, View):
         if quantity < 0:
             return JsonResponse({"error": "Invalid quantity"}, status=400)
 
-        if quantity == 0:
-            cart_item.delete()
-        else:
-            if quantity > cart_item.product_size.stock:
-                return JsonResponse(
-                    {"error": f"Only {cart_item.product_size.stock} items available"},
-                    status=400,
-                )
-            cart_item.quantity = quantity
-            cart_item.save()
-
-        request.session["cart_id"] = cart.id
-        request.session.modified = True
+        if quantity > cart_item.product_size.available:
+            return JsonResponse(
+                {"error": f"Only {cart_item.product_size.available} items available"},
+                status=400,
+            )
+        cart.update_item_quantity(item_id, quantity)
 
-        context = {
-            "cart": cart,
-            "cart_items": cart.items.select_related(
-                "product",
-                "product_size__size",
-            ).order_by("-added_at"),
-        }
-        return TemplateResponse(request, "cart/cart_modal.html", context)
+        # Рядок уже завантажено разом з товаром і розміром, лише нова кількість
+        if quantity:
+            cart_item.quantity = quantity
+        else:
+            cart_item = None
+        return self.render_item_update(request, cart, cart_item)
 
 
 class RemoveCartItemView(CartMixin, View):
     def post(self, request, item_id):
         cart = self.get_cart(request)
-        try:
-            cart_item = cart.items.get(id=item_id)
-            cart_item.delete()
-
-            request.session["cart_id"] = cart.id
-            request.session.modified = True
-            context = {
-                "cart": cart,
-                "cart_items": cart.items.select_related(
-                    "product",
-                    "product_size__size",
-                ).order_by("-added_at"),
-            }
-            return TemplateResponse(request, "cart/cart_modal.html", context)
-        except CartItem.DoesNotExist:
+        if not cart.remove_item(item_id):
             return JsonResponse({"error": "Item not found"}, status=400)
+        return self.render_item_update(request, cart)
 
 
 class CartCountView(CartMixin, View):
@@ -182,9 +152,6 @@ class ClearCartView(CartMixin, View):
         cart = self.get_cart(request)
         cart.clear()
 
-        request.session["cart_id"] = cart.id
-        request.session.modified = True
-
         if request.headers.get("HX-Request"):
             return TemplateResponse(
                 request,
@@ -196,13 +163,96 @@ class ClearCartView(CartMixin, View):
         return JsonResponse({"success": True, "message": "Cart cleared"})
 
 
+class CartBatchView(CartMixin, View):
+    # Скільки операцій приймаємо за один запит
+    MAX_OPERATIONS = 50
+
+    @transaction.atomic
+    def post(self, request):
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+        if isinstance(payload, dict):
+            payload = payload.get("operations")
+        if not isinstance(payload, list) or not payload:
+            return JsonResponse({"error": "Expected a list of operations"}, status=400)
+        if len(payload) > self.MAX_OPERATIONS:
+            return JsonResponse(
+                {"error": f"At most {self.MAX_OPERATIONS} operations per request"},
+                status=400,
+            )
+
+        operations = []
+        errors = {}
+        for index, data in enumerate(payload):
+            form = CartOperationForm(data if isinstance(data, dict) else {})
+            if form.is_valid():
+                operations.append(form.cleaned_data)
+            else:
+                errors[index] = form.errors
+        if errors:
+            return JsonResponse(
+                {"error": "Invalid operations", "errors": errors}, status=400
+            )
+
+        cart = self.get_cart(request, create=True)
+        size_ids = {operation["size_id"] for operation in operations}
+        # Вільні залишки всіх розмірів одним запитом
+        sizes = {
+            pk: (product_id, max(free, 0))
+            for pk, product_id, free in ProductSize.objects.filter(pk__in=size_ids)
+            .annotate(free=F("stock") - F("reserved"))
+            .values_list("pk", "product_id", "free")
+        }
+        missing = size_ids - sizes.keys()
+        if missing:
+            return JsonResponse(
+                {"error": "Unknown sizes", "size_ids": sorted(missing)}, status=400
+            )
+
+        # Операції застосовуються по черзі до поточних кількостей у кошику
+        quantities = cart.get_quantities(size_ids)
+        for operation in operations:
+            pk = operation["size_id"]
+            if operation["op"] == "add":
+                quantities[pk] = quantities.get(pk, 0) + operation["quantity"]
+            elif operation["op"] == "update":
+                quantities[pk] = operation["quantity"]
+            else:
+                quantities[pk] = 0
+
+        unavailable = {
+            pk: sizes[pk][1]
+            for pk, quantity in quantities.items()
+            if quantity > sizes[pk][1]
+        }
+        if unavailable:
+            return JsonResponse(
+                {"error": "Not enough stock", "available": unavailable}, status=400
+            )
+
+        try:
+            cart.set_quantities(
+                quantities, {pk: product_id for pk, (product_id, _) in sizes.items()}
+            )
+        except CartFull as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        return JsonResponse(
+            {
+                "success": True,
+                "total_items": cart.total_items,
+                "subtotal": float(cart.subtotal),
+            }
+        )
+
+
 class CartSummaryView(CartMixin, View):
     def get(self, request):
         cart = self.get_cart(request)
         context = {
             "cart": cart,
-            "cart_items": cart.items.select_related(
-                "product", "product_size__size"
-            ).order_by("-added_at"),
+            "cart_items": cart.get_items(),
         }
         return TemplateResponse(request, "cart/cart_summary.html", context)
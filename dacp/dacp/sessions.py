@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db, db
+from django.utils.deprecation import MiddlewareMixin
+
+# Коли в сесії востаннє продовжувався термін дії (unix time)
+REFRESHED_KEY = "_expiry_refreshed"
+
+# З SESSION_CACHE_READS сесії читаються з кешу, а база лише страхує кеш
+_BaseStore = cached_db.SessionStore if settings.SESSION_CACHE_READS else db.SessionStore
+
+
+class SessionStore(_BaseStore):
+    # Знімок серіалізованих даних на момент завантаження. Якщо після запиту дані
+    # ті самі (session[key] = те саме значення), UPDATE django_session не потрібен.
+    # Порівнюємо саме серіалізовані дані: зміни списків чи словників на місці
+    # теж помітні
+    def _snapshot(self, data):
+        return self.serializer().dumps(data)
+
+    def load(self):
+        data = super().load()
+        self._loaded = self._snapshot(data)
+        return data
+
+    def save(self, must_create=False):
+        data = self._get_session(no_load=must_create)
+        if (
+            not must_create
+            and self.session_key
+            and self._snapshot(data) == getattr(self, "_loaded", None)
+        ):
+            return
+        # Кожне збереження й так продовжує термін дії, тож оновлюємо мітку
+        if data:
+            data[REFRESHED_KEY] = int(time.time())
+        super().save(must_create)
+        self._loaded = self._snapshot(data)
+
+
+class SessionExpiryMiddleware(MiddlewareMixin):
+    # Замість SESSION_SAVE_EVERY_REQUEST: термін дії сесії продовжується не частіше,
+    # ніж раз на SESSION_REFRESH_INTERVAL. Мітка лежить у самій сесії, тож запити,
+    # які сесію не читали, її й не завантажують.
+    # Має стояти після SessionMiddleware
+    def process_response(self, request, response):
+        session = getattr(request, "session", None)
+        if session is None or not session.accessed or session.modified:
+            return response
+        if not session.session_key or session.is_empty():
+            return response
+
+        now = int(time.time())
+        if now - session.get(REFRESHED_KEY, 0) >= settings.SESSION_REFRESH_INTERVAL:
+            # Зміна мітки змушує SessionMiddleware зберегти сесію й оновити cookie
+            session[REFRESHED_KEY] = now
+        return response
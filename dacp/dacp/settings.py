@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Cтворені мною додатки
     "main",
     "cart",
@@ -52,6 +53,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "dacp.sessions.SessionExpiryMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -98,6 +100,17 @@ DATABASES = {
     }
 }
 
+# Версія каталогу і закешовані відповіді мають бути спільними для всіх воркерів.
+# Без REDIS_URL Django бере LocMemCache, який підходить лише для розробки:
+# без спільного кешу при DEBUG = False попереджає main.W001, а check --deploy падає (main.E001)
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -150,11 +163,39 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Налаштування сесій
 SESSION_COOKIE_AGE = 86400  # Термін дії сесії - 30 днів
-SESSION_SAVE_EVERY_REQUEST = True  # Оновлення терміну дії сесії при кожному запиті але доп. навантаження на сервер
+SESSION_SAVE_EVERY_REQUEST = False  # Сесія зберігається лише при реальних змінах
+SESSION_ENGINE = "dacp.sessions"
+SESSION_REFRESH_INTERVAL = (
+    3600  # Як часто (сек.) продовжувати термін дії сесії без змін
+)
+SESSION_CACHE_READS = (
+    os.getenv("SESSION_CACHE_READS") == "1"
+)  # Читати сесії з кешу (як cached_db)
+
+# Де зберігається кошик: "db" (Cart/CartItem), "cache" або "cookie" (підписаний cookie для анонімів)
+CART_STORAGE = os.getenv("CART_STORAGE", "db")
+# Для кеш-сховища: фонове збереження кошиків користувачів у базу
+CART_WRITE_BEHIND = os.getenv("CART_WRITE_BEHIND") == "1"
+CART_WRITE_BEHIND_INTERVAL = 5  # секунд
+CART_IDLE_DAYS = 30  # purge_carts видаляє кошики, які не змінювались стільки днів
+
+# Токен для збору /metrics/catalog-cache/ без входу в адмінку (інакше лише персонал)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
 
 # Вказуємо джанго використовувати цю модель.
 AUTH_USER_MODEL = "users.CustomUser"
 
 # Stripe платіжна система для крипти
+# Скільки (сек.) товар утримується за неоплаченим замовленням. Сесія Stripe
+# закривається раніше (STRIPE_SESSION_TTL), щоб оплата не прийшла після звільнення резерву
+STOCK_RESERVATION_TTL = 35 * 60
+STRIPE_SESSION_TTL = 30 * 60  # Мінімум, який дозволяє Stripe
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+# Адреса API можна підмінити локальним фейковим сервером (payment.fake_stripe)
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+STRIPE_TIMEOUT = (3, 10)  # секунд: з'єднання, відповідь
+STRIPE_MAX_NETWORK_RETRIES = 1
+# Повторні спроби обробки подій вебхука (process_stripe_events)
+STRIPE_EVENT_MAX_ATTEMPTS = 8
+STRIPE_EVENT_RETRY_DELAY = 30  # секунд, подвоюється з кожною спробою
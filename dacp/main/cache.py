@@ -0,0 +1,151 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+VERSION_KEYS = {
+    "catalog": "catalog:version",
+    "banner": "banner:version",
+}
+RESPONSE_CACHE_TIMEOUT = 600
+CACHE_STATS_KEYS = {
+    "hit": "catalog:cache:hits",
+    "miss": "catalog:cache:misses",
+}
+
+
+def _initial_version():
+    # Якщо ключ версії витіснили з кешу, нова версія все одно більша за всі попередні
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    key = VERSION_KEYS[name]
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+# Усі закешовані відповіді старої версії стають недосяжними
+def bump_version(name):
+    key = VERSION_KEYS[name]
+    cache.set(f"{key}:changed", time.time(), None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+
+
+def get_changed_at(name):
+    # Час останньої зміни для Last-Modified; без запису вважаємо, що змінилось щойно
+    key = f"{VERSION_KEYS[name]}:changed"
+    changed_at = cache.get(key)
+    if changed_at is None:
+        cache.add(key, time.time(), None)
+        changed_at = cache.get(key)
+    return changed_at
+
+
+# Журнал змін вітрини для індексу підказок: кожен запис — id товарів під окремим
+# номером, тож воркер дочитує лише нові записи. Пропущений запис (витіснений
+# з кешу) означає повну перебудову індексу
+LISTING_CHANGES_KEY = "listing:changes"
+LISTING_CHANGES_TIMEOUT = 3600
+LISTING_CHANGES_LIMIT = 500
+
+
+def record_listing_changes(product_ids):
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    cache.add(LISTING_CHANGES_KEY, 0, None)
+    try:
+        number = cache.incr(LISTING_CHANGES_KEY)
+    except ValueError:
+        return
+    cache.set(f"{LISTING_CHANGES_KEY}:{number}", product_ids, LISTING_CHANGES_TIMEOUT)
+
+
+# Повертає (номер останнього запису, id змінених після since товарів).
+# None замість id — журнал неповний, треба перебудувати все
+def get_listing_changes(since):
+    cache.add(LISTING_CHANGES_KEY, 0, None)
+    last = cache.get(LISTING_CHANGES_KEY, 0)
+    if since is None or since > last or last - since > LISTING_CHANGES_LIMIT:
+        return last, None
+    keys = [f"{LISTING_CHANGES_KEY}:{number}" for number in range(since + 1, last + 1)]
+    entries = cache.get_many(keys)
+    if len(entries) < len(keys):
+        return last, None
+    changed = set()
+    for product_ids in entries.values():
+        changed.update(product_ids)
+    return last, changed
+
+
+def get_catalog_version():
+    return get_version("catalog")
+
+
+def bump_catalog_version():
+    return bump_version("catalog")
+
+
+# Версії окремих товарів для кешу фрагментів сторінки товару.
+# Видалений ключ створюється заново з новою міткою часу
+def _product_version_key(product_id):
+    return f"product:{product_id}:version"
+
+
+def get_product_version(product_id):
+    key = _product_version_key(product_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_product_versions(product_ids):
+    cache.delete_many([_product_version_key(product_id) for product_id in product_ids])
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def record_cache_result(hit):
+    _incr(CACHE_STATS_KEYS["hit" if hit else "miss"])
+
+
+def get_cache_stats():
+    values = cache.get_many(CACHE_STATS_KEYS.values())
+    return {name: values.get(key, 0) for name, key in CACHE_STATS_KEYS.items()}
+
+
+def normalize_params(params):
+    # Порядок параметрів і порожні значення не впливають на ключ кешу
+    items = []
+    for name in sorted(params):
+        if hasattr(params, "getlist"):
+            values = params.getlist(name)
+        else:
+            values = params[name]
+        if isinstance(values, str):
+            values = [values]
+        for value in sorted(str(value).strip() for value in values):
+            if value:
+                items.append(f"{name}={value}")
+    return "&".join(items)
+
+
+def catalog_cache_key(namespace, category_slug, params, fragment=""):
+    raw = f"{category_slug or ''}|{fragment}|{normalize_params(params)}"
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f"catalog:{namespace}:v{get_catalog_version()}:{digest}"
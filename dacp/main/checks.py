@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+# Версії каталогу (main.cache) живуть у кеші: у кеші процесу зміну залишків,
+# зроблену process_stripe_events чи іншим воркером, решта процесів не побачить
+def _local_cache(level, id):
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [
+        level(
+            f"The default cache ({backend}) is local to one process, so catalog "
+            "version bumps do not reach other workers and they keep serving "
+            "stale pages and 304 responses.",
+            hint="Set REDIS_URL (or another shared cache backend) in production.",
+            id=id,
+        )
+    ]
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.DEBUG:
+        return []
+    return _local_cache(Warning, "main.W001")
+
+
+# manage.py check --deploy не пропускає розгортання без спільного кешу
+@register(Tags.caches, deploy=True)
+def check_shared_cache_deploy(app_configs, **kwargs):
+    return _local_cache(Error, "main.E001")
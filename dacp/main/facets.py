@@ -0,0 +1,74 @@
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, F, Value, When
+from django.db.models.functions import Cast, Lower
+from .cache import catalog_cache_key
+from .models import ProductSize
+
+FACET_CACHE_TIMEOUT = 300
+
+# Верхні межі цінових діапазонів; останній діапазон відкритий
+PRICE_BUCKETS = (50, 100, 200, 500)
+
+
+def price_bucket_ranges():
+    bounds = (0,) + PRICE_BUCKETS
+    ranges = [(low, high) for low, high in zip(bounds, PRICE_BUCKETS)]
+    ranges.append((PRICE_BUCKETS[-1], None))
+    return ranges
+
+
+def _price_bucket():
+    return Cast(
+        Case(
+            *[
+                When(price__lt=bound, then=Value(index))
+                for index, bound in enumerate(PRICE_BUCKETS)
+            ],
+            default=Value(len(PRICE_BUCKETS)),
+        ),
+        output_field=CharField(),
+    )
+
+
+def _grouped(queryset, facet, key):
+    return (
+        queryset.order_by()
+        .annotate(facet=Value(facet, output_field=CharField()), key=key)
+        .values("facet", "key")
+        .annotate(count=Count("pk", distinct=True))
+    )
+
+
+# build_queryset(exclude) повертає відфільтровані товари без фільтра цього виміру,
+# тож кожен фасет рахує варіанти, на які покупець ще може перемкнутись.
+# Усі фасети йдуть одним запитом UNION ALL
+def compute_facets(build_queryset):
+    categories = _grouped(
+        build_queryset("category"),
+        "category",
+        Cast("category_id", output_field=CharField()),
+    )
+    colors = _grouped(build_queryset("color"), "color", Lower("color"))
+    prices = _grouped(build_queryset("price"), "price", _price_bucket())
+    sizes = (
+        ProductSize.objects.filter(
+            stock__gt=F("reserved"),
+            product__in=build_queryset("size").order_by().values("pk"),
+        )
+        .annotate(facet=Value("size", output_field=CharField()), key=F("size__name"))
+        .values("facet", "key")
+        .annotate(count=Count("product_id", distinct=True))
+    )
+
+    facets = {"category": {}, "color": {}, "price": {}, "size": {}}
+    for row in categories.union(colors, prices, sizes, all=True):
+        facets[row["facet"]][row["key"]] = row["count"]
+    return facets
+
+
+def get_facets(category_slug, params, build_queryset):
+    return cache.get_or_set(
+        catalog_cache_key("facets", category_slug, params),
+        lambda: compute_facets(build_queryset),
+        FACET_CACHE_TIMEOUT,
+    )
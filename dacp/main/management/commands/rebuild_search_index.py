@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from main.models import Product, ProductListing
+from main.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the full-text search vectors of all products in primary-key batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = 0
+        total = 0
+
+        while True:
+            ids = list(
+                Product.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                total += update_search_vectors(
+                    Product.objects.filter(pk__gte=ids[0], pk__lte=ids[-1])
+                )
+                # Каталог шукає по копії вектора у вітрині
+                ProductListing.objects.refresh(ids)
+            last_id = ids[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt search index for {total} products")
+        )
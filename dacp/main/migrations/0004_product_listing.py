@@ -0,0 +1,158 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:26
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import migrations, models
+from django.db.models import Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_listing(apps, schema_editor):
+    Product = apps.get_model("main", "Product")
+    ProductListing = apps.get_model("main", "ProductListing")
+    products = Product.objects.select_related("category").annotate(
+        in_stock_sizes=ArrayAgg(
+            "product_sizes__size__name",
+            filter=Q(product_sizes__stock__gt=0),
+            distinct=True,
+            default=Value([]),
+        ),
+        stock_total=Coalesce(Sum("product_sizes__stock"), 0),
+    )
+    ProductListing.objects.bulk_create(
+        [
+            ProductListing(
+                product_id=product.pk,
+                category_id=product.category_id,
+                category_slug=product.category.slug,
+                category_name=product.category.name,
+                name=product.name,
+                slug=product.slug,
+                color=product.color,
+                price=product.price,
+                sizes=product.in_stock_sizes,
+                total_stock=product.stock_total,
+                main_image=product.main_image.name,
+                search_vector=product.search_vector,
+                created_at=product.created_at,
+                updated_at=product.updated_at,
+            )
+            for product in products.iterator(chunk_size=1000)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0003_product_search_vector"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductListing",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="listing",
+                        serialize=False,
+                        to="main.product",
+                    ),
+                ),
+                ("category_slug", models.SlugField(max_length=100)),
+                ("category_name", models.CharField(max_length=100)),
+                ("name", models.CharField(max_length=150)),
+                ("slug", models.SlugField(max_length=100)),
+                ("color", models.CharField(max_length=50)),
+                ("price", models.DecimalField(decimal_places=2, max_digits=10)),
+                (
+                    "sizes",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=25),
+                        blank=True,
+                        default=list,
+                        size=None,
+                    ),
+                ),
+                ("total_stock", models.PositiveIntegerField(default=0)),
+                ("main_image", models.ImageField(upload_to="products/")),
+                (
+                    "search_vector",
+                    django.contrib.postgres.search.SearchVectorField(
+                        editable=False, null=True
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_search_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_name_trgm_idx",
+        ),
+        migrations.AddField(
+            model_name="productlisting",
+            name="category",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="listings",
+                to="main.category",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productlisting",
+            index=models.Index(
+                fields=["created_at", "product"], name="listing_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productlisting",
+            index=models.Index(fields=["price", "product"], name="listing_price_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="productlisting",
+            index=models.Index(
+                fields=["category_slug", "created_at", "product"],
+                name="listing_cat_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productlisting",
+            index=models.Index(
+                fields=["category_slug", "price", "product"],
+                name="listing_cat_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productlisting",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["sizes"], name="listing_sizes_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productlisting",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="listing_search_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productlisting",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["name"],
+                name="listing_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.RunPython(populate_listing, migrations.RunPython.noop),
+    ]
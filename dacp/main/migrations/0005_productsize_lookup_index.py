@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0004_product_listing"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="productlisting",
+            name="listing_sizes_idx",
+        ),
+        migrations.AlterField(
+            model_name="productsize",
+            name="product",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="product_sizes",
+                to="main.product",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productsize",
+            index=models.Index(
+                fields=["product", "size"],
+                include=("stock",),
+                name="productsize_lookup_idx",
+            ),
+        ),
+    ]
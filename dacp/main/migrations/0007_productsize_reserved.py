@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0006_copurchase"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productsize",
+            name="reserved",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0007_productsize_reserved"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="productsize",
+            name="productsize_lookup_idx",
+        ),
+        migrations.AddIndex(
+            model_name="productsize",
+            index=models.Index(
+                fields=["product", "size"],
+                include=("stock", "reserved"),
+                name="productsize_lookup_idx",
+            ),
+        ),
+    ]
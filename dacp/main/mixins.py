@@ -0,0 +1,65 @@
+import hashlib
+import math
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from cart.storage import CART_STORAGES
+from .cache import get_changed_at, get_version, normalize_params
+
+# Cookie, за якими сховища кошика знаходять кошик анонімного відвідувача
+CART_COOKIES = tuple(
+    storage.COOKIE_NAME
+    for storage in CART_STORAGES.values()
+    if hasattr(storage, "COOKIE_NAME")
+)
+
+
+class ConditionalGetMixin:
+    # Від яких версій (див. cache.VERSION_KEYS) залежить вміст сторінки
+    validator_versions = ("catalog",)
+
+    def get_validators(self):
+        request = self.request
+        is_htmx = bool(request.headers.get("Hx-Request"))
+
+        # Повна сторінка містить кошик і меню користувача, тож 304 віддаємо
+        # лише відвідувачам без сесії і без кошика (краулери, перший захід)
+        if not is_htmx and any(
+            name in request.COOKIES
+            for name in (settings.SESSION_COOKIE_NAME, *CART_COOKIES)
+        ):
+            return None, None
+
+        parts = [
+            request.path,
+            "htmx" if is_htmx else "page",
+            normalize_params(request.GET),
+            # Фрагменти містять csrf-токен, прив'язаний до cookie
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+        ]
+        parts += [str(get_version(name)) for name in self.validator_versions]
+        etag = '"%s"' % hashlib.md5("|".join(parts).encode()).hexdigest()
+        last_modified = max(get_changed_at(name) for name in self.validator_versions)
+        return etag, math.ceil(last_modified)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return super().dispatch(request, *args, **kwargs)
+
+        etag, last_modified = self.get_validators()
+        if etag:
+            # 304 без жодного запиту до бази і без рендерингу шаблонів
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is not None:
+                patch_vary_headers(response, ("Cookie", "HX-Request"))
+                return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        if etag and response.status_code == 200:
+            response.headers["ETag"] = etag
+            response.headers["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ("Cookie", "HX-Request"))
+        return response
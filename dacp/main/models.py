@@ -1,5 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.utils.text import slugify
+from .cache import record_listing_changes
 
 # Create your models here.
 
@@ -25,15 +32,35 @@ class Size(models.Model):
 
 
 class ProductSize(models.Model):
+    # Окремий індекс по product_id не потрібен: його покриває productsize_lookup_idx
     product = models.ForeignKey(
-        "Product", on_delete=models.CASCADE, related_name="product_sizes"
+        "Product",
+        on_delete=models.CASCADE,
+        related_name="product_sizes",
+        db_index=False,
     )
     size = models.ForeignKey(Size, on_delete=models.CASCADE)
     stock = models.PositiveIntegerField(default=0)
+    # Скільки зі stock утримують неоплачені замовлення (orders.StockReservation)
+    reserved = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # EXISTS-фільтри каталогу читають наявність (stock > reserved) лише з індексу
+            models.Index(
+                fields=["product", "size"],
+                include=["stock", "reserved"],
+                name="productsize_lookup_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.size.name} - ({self.stock} in stock) for {self.product.name}"
 
+    @property
+    def available(self):
+        return max(self.stock - self.reserved, 0)
+
 
 class Product(models.Model):
     name = models.CharField(max_length=150)
@@ -47,6 +74,16 @@ class Product(models.Model):
     main_image = models.ImageField(upload_to="products/")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Оновлюється сигналом (main/signals.py) або командою rebuild_search_index.
+    # Шукаємо по копії в ProductListing, тому індекси пошуку живуть там
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        # Індекси під сортування за датою/ціною (новинки на головній тощо)
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="product_created_id_idx"),
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+        ]
 
 
 def save(self, *args, **kwargs):
@@ -69,6 +106,132 @@ class ProductImage(models.Model):
         return f"Image for {self.product.name}"
 
 
+class ProductListingManager(models.Manager):
+    def refresh(self, product_ids):
+        # Перебудовує рядки вітрини для переданих товарів: один агрегуючий SELECT
+        # і один INSERT ... ON CONFLICT DO UPDATE
+        product_ids = list(product_ids)
+        # Індекс підказок дочитує змінені товари після коміту
+        transaction.on_commit(lambda: record_listing_changes(product_ids))
+        products = (
+            Product.objects.filter(pk__in=product_ids)
+            .select_related("category")
+            .annotate(
+                in_stock_sizes=ArrayAgg(
+                    "product_sizes__size__name",
+                    # Повністю зарезервований розмір не показуємо як наявний
+                    filter=Q(product_sizes__stock__gt=F("product_sizes__reserved")),
+                    distinct=True,
+                    default=Value([]),
+                ),
+                stock_total=Coalesce(Sum("product_sizes__stock"), 0),
+            )
+        )
+        listings = [
+            ProductListing(
+                product=product,
+                category_id=product.category_id,
+                category_slug=product.category.slug,
+                category_name=product.category.name,
+                name=product.name,
+                slug=product.slug,
+                color=product.color,
+                price=product.price,
+                sizes=product.in_stock_sizes,
+                total_stock=product.stock_total,
+                main_image=product.main_image.name,
+                search_vector=product.search_vector,
+                created_at=product.created_at,
+                updated_at=product.updated_at,
+            )
+            for product in products
+        ]
+        return self.bulk_create(
+            listings,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=[
+                field.name
+                for field in ProductListing._meta.concrete_fields
+                if not field.primary_key
+            ],
+        )
+
+
+# Денормалізована вітрина каталогу: один рядок на товар, без JOIN і DISTINCT при читанні.
+# Синхронізується сигналами з Product, ProductSize, Category і Size (main/signals.py)
+class ProductListing(models.Model):
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="listing"
+    )
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="listings"
+    )
+    category_slug = models.SlugField(max_length=100)
+    category_name = models.CharField(max_length=100)
+    name = models.CharField(max_length=150)
+    slug = models.SlugField(max_length=100)
+    color = models.CharField(max_length=50)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Назви розмірів, які є в наявності
+    sizes = ArrayField(models.CharField(max_length=25), default=list, blank=True)
+    total_stock = models.PositiveIntegerField(default=0)
+    main_image = models.ImageField(upload_to="products/")
+    search_vector = SearchVectorField(null=True, editable=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    objects = ProductListingManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "product"], name="listing_created_idx"),
+            models.Index(fields=["price", "product"], name="listing_price_idx"),
+            models.Index(
+                fields=["category_slug", "created_at", "product"],
+                name="listing_cat_created_idx",
+            ),
+            models.Index(
+                fields=["category_slug", "price", "product"],
+                name="listing_cat_price_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="listing_search_idx"),
+            GinIndex(
+                fields=["name"],
+                opclasses=["gin_trgm_ops"],
+                name="listing_name_trgm_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+# Скільки оплачених замовлень містили обидва товари ("разом купують").
+# Пари зберігаються в обидва боки; наповнює команда build_recommendations
+class CoPurchase(models.Model):
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="co_purchases"
+    )
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "related"], name="copurchase_pair_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["product", "-count", "related"], name="copurchase_top_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.related_id} ({self.count})"
+
+
 class Banner(models.Model):
     title = models.CharField(max_length=200, verbose_name="Title")
     subtitle = models.CharField(
@@ -0,0 +1,98 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connection
+from django.db.models import Q
+
+# Порядки сортування каталогу. Кожен закінчується на pk, щоб курсор був однозначним
+SORT_ORDERINGS = {
+    "newest": ("-created_at", "-pk"),
+    "price_low": ("price", "pk"),
+    "price_high": ("-price", "-pk"),
+}
+DEFAULT_SORT = "newest"
+
+# Нижче цього порогу рахуємо точно, вище - беремо оцінку з pg_class
+COUNT_ESTIMATE_THRESHOLD = 10000
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+# Пагінація курсором: кожна сторінка продовжується після останнього рядка попередньої
+class KeysetPaginator:
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = ordering
+        self.per_page = per_page
+        self.fields = [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, name) for name, _ in self.fields]
+        raw = json.dumps(values, default=str, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (ValueError, binascii.Error):
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+
+        decoded = []
+        for (name, _), value in zip(self.fields, values):
+            try:
+                field = self.queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # Анотації (наприклад, rank у пошуку) зберігаються як є
+                decoded.append(value)
+                continue
+            try:
+                decoded.append(field.to_python(value))
+            except ValidationError:
+                raise InvalidCursor(cursor)
+        return decoded
+
+    def _after(self, values):
+        # (a, b) > (x, y)  ==>  a > x OR (a = x AND b > y), з урахуванням напрямку
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, values):
+            lookup = "lt" if descending else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_page(self, cursor=None):
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode_cursor(cursor)))
+
+        # Беремо на один рядок більше, щоб дізнатись, чи є наступна сторінка
+        items = list(queryset[: self.per_page + 1])
+        next_cursor = None
+        if len(items) > self.per_page:
+            items = items[: self.per_page]
+            next_cursor = self.encode_cursor(items[-1])
+        return items, next_cursor
+
+
+# Повертає (кількість, чи це оцінка). Без фільтрів не проходимо всю таблицю
+def count_products(queryset):
+    queryset = queryset.order_by()
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # reltuples = -1, якщо таблицю ще не аналізували
+        if row and row[0] >= COUNT_ESTIMATE_THRESHOLD:
+            return row[0], True
+    return queryset.count(), False
@@ -0,0 +1,46 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+from .models import Product
+
+SEARCH_CONFIG = "english"
+
+# Порядок видачі для пошуку: спочатку найрелевантніші
+RELEVANCE_ORDERING = ("-rank", "-pk")
+
+
+def product_search_vector():
+    return (
+        SearchVector("name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("color", weight="B", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset=None):
+    # Один UPDATE на всю вибірку, вектор рахує сам Postgres
+    if queryset is None:
+        queryset = Product.objects.all()
+    return queryset.update(search_vector=product_search_vector())
+
+
+def search_products(queryset, query):
+    search_query = SearchQuery(query, search_type="websearch", config=SEARCH_CONFIG)
+    # Повнотекстовий збіг по GIN-індексу або схожість назви через pg_trgm (для опечаток).
+    # Обидві умови покриті індексами, тож Postgres робить BitmapOr без seq scan
+    return queryset.filter(
+        Q(search_vector=search_query) | Q(name__trigram_similar=query)
+    ).annotate(
+        # ts_rank і similarity повертають float4; rank іде в курсор пагінації,
+        # тож приводимо до float8, щоб значення з курсора точно збігалось з рядком
+        rank=Cast(
+            SearchRank(F("search_vector"), search_query)
+            + TrigramSimilarity("name", query),
+            FloatField(),
+        )
+    )
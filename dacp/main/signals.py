@@ -0,0 +1,141 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import (
+    bump_catalog_version,
+    bump_product_versions,
+    bump_version,
+    record_listing_changes,
+)
+from .models import (
+    Banner,
+    Category,
+    Product,
+    ProductImage,
+    ProductListing,
+    ProductSize,
+    Size,
+)
+from .search import update_search_vectors
+
+# Товари, чиї рядки вітрини треба перебудувати після коміту поточної транзакції
+_pending = threading.local()
+
+
+def schedule_listing_refresh(product_ids):
+    # Після коміту, щоб каскадне видалення товару не відновило його рядок у вітрині.
+    # Кілька змін в одній транзакції (інлайни в адмінці) дають одне оновлення
+    pending = getattr(_pending, "ids", None)
+    if pending is None:
+        pending = _pending.ids = set()
+    pending.update(product_ids)
+    transaction.on_commit(flush_listing_refresh)
+
+
+def flush_listing_refresh():
+    ids = getattr(_pending, "ids", None)
+    if ids:
+        _pending.ids = set()
+        ProductListing.objects.refresh(ids)
+
+
+# Пошуковий вектор перераховуємо після кожного збереження товару.
+# update() не викликає post_save, тож рекурсії немає
+@receiver(post_save, sender=Product)
+def sync_product(sender, instance, **kwargs):
+    update_search_vectors(Product.objects.filter(pk=instance.pk))
+    schedule_listing_refresh([instance.pk])
+
+
+# Рядок вітрини видаляється каскадом разом з товаром, мимо refresh()
+@receiver(post_delete, sender=Product)
+def forget_listing(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: record_listing_changes([product_id]))
+
+
+@receiver(post_save, sender=ProductSize)
+@receiver(post_delete, sender=ProductSize)
+def refresh_listing_stock(sender, instance, **kwargs):
+    schedule_listing_refresh([instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+def refresh_listing_category(sender, instance, created, **kwargs):
+    if not created:
+        ProductListing.objects.filter(category=instance).update(
+            category_slug=instance.slug, category_name=instance.name
+        )
+
+
+@receiver(post_save, sender=Size)
+def refresh_listing_size(sender, instance, created, **kwargs):
+    if not created:
+        schedule_listing_refresh(
+            ProductSize.objects.filter(size=instance).values_list(
+                "product_id", flat=True
+            )
+        )
+
+
+# Будь-яка зміна каталогу робить закешовані відповіді застарілими.
+# Реєструється останнім, тож версія змінюється вже після оновлення вітрини
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductSize)
+@receiver(post_delete, sender=ProductSize)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Size)
+@receiver(post_delete, sender=Size)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_catalog_cache(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def invalidate_banners(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version("banner"))
+
+
+# Кеш галереї і розмірів на сторінці товару
+def schedule_product_fragments_reset(product_ids):
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: bump_product_versions(product_ids))
+
+
+# Для raw UPDATE залишків (оплата, резерви), які обходять post_save ProductSize
+def schedule_stock_refresh(product_ids):
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    schedule_listing_refresh(product_ids)
+    schedule_product_fragments_reset(product_ids)
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+def reset_product_fragments(sender, instance, **kwargs):
+    schedule_product_fragments_reset([instance.pk])
+
+
+@receiver(post_save, sender=ProductSize)
+@receiver(post_delete, sender=ProductSize)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def reset_product_fragments_for_item(sender, instance, **kwargs):
+    schedule_product_fragments_reset([instance.product_id])
+
+
+@receiver(post_save, sender=Size)
+def reset_product_fragments_for_size(sender, instance, created, **kwargs):
+    if not created:
+        schedule_product_fragments_reset(
+            ProductSize.objects.filter(size=instance).values_list(
+                "product_id", flat=True
+            )
+        )
@@ -0,0 +1,176 @@
+import bisect
+import re
+import threading
+import time
+from collections import Counter, namedtuple
+
+from .cache import get_catalog_version, get_listing_changes
+from .models import Category, ProductListing
+
+SUGGESTION_LIMIT = 8
+
+# Як часто воркер звіряє свою версію індексу з версією каталогу
+SYNC_INTERVAL = 5
+
+# Категорії й кольори показуємо вище за товари
+KINDS = ("category", "color", "product")
+
+Suggestion = namedtuple("Suggestion", ["label", "kind", "value"])
+
+_token_re = re.compile(r"\w+")
+
+
+def _product_keys(name):
+    # Повна назва і кожне слово окремо, щоб "shi" знаходив і "Red Shirt"
+    name = name.lower()
+    keys = {name}
+    keys.update(token for token in _token_re.findall(name) if len(token) > 1)
+    return keys
+
+
+class SuggestionIndex:
+    # Для кожного типу відсортований масив (ключ, підпис, значення) з пошуком через bisect.
+    # Живе в пам'яті воркера; оновлюється дельтою, коли змінюється версія каталогу
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {kind: [] for kind in KINDS}
+        self._building = False
+        self._products = {}
+        self._categories = []
+        self._colors = Counter()
+        self._version = None
+        # Номер останнього врахованого запису журналу змін вітрини
+        self._changes_seen = None
+        self._checked_at = 0
+
+    def _insert(self, kind, entry):
+        # Під час повної побудови сортуємо один раз наприкінці
+        if self._building:
+            self._entries[kind].append(entry)
+        else:
+            bisect.insort(self._entries[kind], entry)
+
+    def _remove(self, kind, entry):
+        entries = self._entries[kind]
+        index = bisect.bisect_left(entries, entry)
+        if index < len(entries) and entries[index] == entry:
+            del entries[index]
+
+    def _add_color(self, color):
+        self._colors[color] += 1
+        if self._colors[color] == 1:
+            self._insert("color", (color, color, color))
+
+    def _remove_color(self, color):
+        self._colors[color] -= 1
+        if self._colors[color] <= 0:
+            del self._colors[color]
+            self._remove("color", (color, color, color))
+
+    def _add_product(self, pk, name, slug, color):
+        self._remove_product(pk)
+        entries = [(key, name, slug) for key in _product_keys(name)]
+        for entry in entries:
+            self._insert("product", entry)
+        color = color.strip().lower()
+        if color:
+            self._add_color(color)
+        self._products[pk] = (entries, color)
+
+    def _remove_product(self, pk):
+        entries, color = self._products.pop(pk, ((), ""))
+        for entry in entries:
+            self._remove("product", entry)
+        if color:
+            self._remove_color(color)
+
+    def _load_categories(self):
+        for entry in self._categories:
+            self._remove("category", entry)
+        self._categories = [
+            (name.lower(), name, slug)
+            for name, slug in Category.objects.values_list("name", "slug")
+        ]
+        for entry in self._categories:
+            self._insert("category", entry)
+
+    def _rebuild(self, changes_seen):
+        self._entries = {kind: [] for kind in KINDS}
+        self._products = {}
+        self._categories = []
+        self._colors = Counter()
+        # Номер журналу беремо до читання: зміни під час побудови дочитаються потім
+        self._changes_seen = changes_seen
+        self._building = True
+        try:
+            self._load_categories()
+            for row in ProductListing.objects.values_list(
+                "pk", "name", "slug", "color"
+            ):
+                self._add_product(*row)
+        finally:
+            self._building = False
+        for entries in self._entries.values():
+            entries.sort()
+
+    def _sync(self):
+        # Перечитуємо лише товари з журналу змін: є у вітрині — оновлюємо, немає — прибираємо
+        last, changed = get_listing_changes(self._changes_seen)
+        if changed is None:
+            self._rebuild(last)
+            return
+        rows = {
+            row[0]: row
+            for row in ProductListing.objects.filter(pk__in=changed).values_list(
+                "pk", "name", "slug", "color"
+            )
+        }
+        for pk in changed:
+            if pk in rows:
+                self._add_product(*rows[pk])
+            else:
+                self._remove_product(pk)
+        self._load_categories()
+        self._changes_seen = last
+
+    def ensure_fresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < SYNC_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            version = get_catalog_version()
+            if version == self._version:
+                return
+            self._sync()
+            self._version = version
+
+    def search(self, prefix, limit=SUGGESTION_LIMIT):
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        self.ensure_fresh()
+
+        matches = []
+        seen = set()
+        with self._lock:
+            for kind in KINDS:
+                entries = self._entries[kind]
+                index = bisect.bisect_left(entries, (prefix,))
+                while index < len(entries) and len(matches) < limit:
+                    key, label, value = entries[index]
+                    if not key.startswith(prefix):
+                        break
+                    # Товар може збігтися кількома словами назви
+                    if (kind, value) not in seen:
+                        seen.add((kind, value))
+                        matches.append(Suggestion(label, kind, value))
+                    index += 1
+        return matches
+
+
+suggestion_index = SuggestionIndex()
+
+
+def get_suggestions(query, limit=SUGGESTION_LIMIT):
+    return suggestion_index.search(query, limit)
@@ -7,9 +7,19 @@ urlpatterns = [
     path("", views.IndexView.as_view(), name="index"),
     path("catalog/", views.CatalogView.as_view(), name="catalog_all"),
     path("catalog/<slug:category_slug>/", views.CatalogView.as_view(), name="catalog"),
+    path(
+        "search/suggestions/",
+        views.SearchSuggestionsView.as_view(),
+        name="search_suggestions",
+    ),
     path(
         "product/<slug:slug>/", views.ProductDetailView.as_view(), name="product_detail"
     ),
     path("about/", views.AboutView.as_view(), name="about"),
     path("contact/", views.ContactView.as_view(), name="contact"),
+    path(
+        "metrics/catalog-cache/",
+        views.CatalogCacheMetricsView.as_view(),
+        name="catalog_cache_metrics",
+    ),
 ]
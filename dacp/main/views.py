@@ -1,12 +1,52 @@
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.db.models import Exists, F, OuterRef, Q
+from django.http import HttpResponse, QueryDict
 from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.utils.http import urlencode
+from django.utils.safestring import mark_safe
+from django.views import View
 from django.views.generic import TemplateView, DetailView
 from django.template.response import TemplateResponse
-from django.db.models import Q
-from .models import Category, Product, Size, Banner
-
-
-class IndexView(TemplateView):
+from .models import (
+    Category,
+    CoPurchase,
+    Product,
+    ProductListing,
+    ProductSize,
+    Size,
+    Banner,
+)
+from .pagination import (
+    DEFAULT_SORT,
+    SORT_ORDERINGS,
+    InvalidCursor,
+    KeysetPaginator,
+    count_products,
+)
+from .search import RELEVANCE_ORDERING, search_products
+from .facets import get_facets, price_bucket_ranges
+from .suggestions import get_suggestions
+from .mixins import ConditionalGetMixin
+from .cache import (
+    RESPONSE_CACHE_TIMEOUT,
+    catalog_cache_key,
+    get_cache_stats,
+    get_product_version,
+    record_cache_result,
+)
+
+
+class IndexView(ConditionalGetMixin, TemplateView):
     template_name = "main/base.html"
+    validator_versions = ("catalog", "banner")
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -53,61 +93,117 @@ class ContactView(TemplateView):
         return TemplateResponse(request, self.template_name, context)
 
 
-class CatalogView(TemplateView):
+# Розміри товару з рядка каталогу, які є в наявності (для EXISTS-підзапитів).
+# Наявність — вільний залишок, без утриманого неоплаченими замовленнями
+def in_stock_sizes(**filters):
+    return ProductSize.objects.filter(
+        product_id=OuterRef("pk"), stock__gt=F("reserved"), **filters
+    ).only("pk")
+
+
+class CatalogView(ConditionalGetMixin, TemplateView):
     template_name = "main/catalog.html"
+    PAGE_SIZE = 12
+
+    FRAGMENT_TEMPLATES = {
+        "page": "main/catalog_content.html",
+        "products": "main/catalog_products.html",
+        "search_input": "main/search_input.html",
+        "search_button": "main/search_button.html",
+        "filters": "main/filter_modal.html",
+    }
 
+    # Фільтри отримують усі значення параметра (size=M&size=L)
     FILTER_MAPPING = {
-        "color": lambda queryset, value: queryset.filter(color__iexact=value),
-        "min_price": lambda queryset, value: queryset.filter(price__gte=value),
-        "max_price": lambda queryset, value: queryset.filter(price__lte=value),
-        "size": lambda queryset, value: queryset.filter(
-            product_sizes__size__name=value
+        "color": lambda queryset, values: queryset.filter(
+            reduce(or_, (Q(color__iexact=value) for value in values))
+        ),
+        "min_price": lambda queryset, values: queryset.filter(price__gte=values[-1]),
+        "max_price": lambda queryset, values: queryset.filter(price__lte=values[-1]),
+        "size": lambda queryset, values: queryset.filter(
+            Exists(in_stock_sizes(size__name__in=values))
         ),
+        "in_stock": lambda queryset, values: queryset.filter(Exists(in_stock_sizes())),
     }
+    MULTI_VALUE_PARAMS = ("color", "size")
+
+    # Які параметри запиту належать якому фасету
+    FACET_PARAMS = {
+        "color": ("color",),
+        "price": ("min_price", "max_price"),
+        "size": ("size",),
+    }
+
+    def filter_products(self, products, exclude=None):
+        skipped = self.FACET_PARAMS.get(exclude, ())
+        for param, filter_func in self.FILTER_MAPPING.items():
+            values = [value for value in self.request.GET.getlist(param) if value]
+            if values and param not in skipped:
+                products = filter_func(products, values)
+        return products
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         category_slug = kwargs.get("category_slug")
-        categories = Category.objects.all()
-        products = Product.objects.all().order_by("-created_at")
+        categories = list(Category.objects.all())
         current_category = None
 
         if category_slug:
             current_category = get_object_or_404(Category, slug=category_slug)
-            products = products.filter(category=current_category)
 
+        orderings = dict(SORT_ORDERINGS)
+        default_sort = DEFAULT_SORT
         query = self.request.GET.get("q")
         if query:
-            products = products.filter(
-                Q(name__icontains=query) | Q(description__icontains=query)
-            )
+            orderings["relevance"] = RELEVANCE_ORDERING
+            default_sort = "relevance"
+
+        # Каталог читає тільки денормалізовану вітрину ProductListing
+        def build_queryset(exclude=None):
+            products = ProductListing.objects.all()
+            if category_slug and exclude != "category":
+                products = products.filter(category_slug=category_slug)
+            if query:
+                products = search_products(products, query)
+            return self.filter_products(products, exclude)
+
+        products = build_queryset().defer("search_vector")
+        filter_params = {
+            param: self.request.GET.get(param, "") for param in self.FILTER_MAPPING
+        }
+        for param in self.MULTI_VALUE_PARAMS:
+            filter_params[param] = [
+                value for value in self.request.GET.getlist(param) if value
+            ]
 
         sort_by = self.request.GET.get("sort")
-        if sort_by == "price_low":
-            products = products.order_by("price")
-        elif sort_by == "price_high":
-            products = products.order_by("-price")
-        elif sort_by == "newest":
-            products = products.order_by("-created_at")
-
-        filter_params = {}
-        for param, filter_func in self.FILTER_MAPPING.items():
-            value = self.request.GET.get(param)
-            if value:
-                products = filter_func(products, value).distinct()
-                filter_params[param] = value
-            else:
-                filter_params[param] = ""
+        if sort_by not in orderings:
+            sort_by = default_sort
+        filter_params["sort"] = sort_by
+
+        fragment = self.get_fragment()
+        if fragment in ("page", "products"):
+            context.update(self.paginate_products(products, orderings[sort_by]))
 
         filter_params["q"] = query or ""
+        sizes = list(Size.objects.all())
+
+        # Фасети потрібні тільки боковій панелі повної сторінки
+        if fragment == "page":
+            facet_filters = {
+                param: value
+                for param, value in filter_params.items()
+                if param != "sort"
+            }
+            facets = get_facets(category_slug, facet_filters, build_queryset)
+            context.update(self.get_facet_context(facets, categories, sizes))
 
         context.update(
             {
                 "categories": categories,
-                "products": products,
                 "current_category": current_category,
                 "filter_params": filter_params,
-                "sizes": Size.objects.all(),
+                "sizes": sizes,
                 "search_query": query or "",
             }
         )
@@ -122,44 +218,222 @@ class CatalogView(TemplateView):
 
         return context
 
+    def facet_url(self, **overrides):
+        params = self.request.GET.copy()
+        for flag in ("cursor", "show_search", "reset_search", "show_filters"):
+            params.pop(flag, None)
+        for param, value in overrides.items():
+            if value in (None, ""):
+                params.pop(param, None)
+            else:
+                params[param] = value
+        return f"{self.request.path}?{params.urlencode()}"
+
+    # Посилання, що додає значення до мультивибору або прибирає його звідти
+    def facet_toggle_url(self, param, value):
+        values = self.request.GET.getlist(param)
+        if value in values:
+            values = [selected for selected in values if selected != value]
+        else:
+            values = values + [value]
+        url = self.facet_url(**{param: None})
+        params = QueryDict(url.split("?", 1)[1], mutable=True)
+        params.setlist(param, values)
+        return f"{self.request.path}?{params.urlencode()}"
+
+    def get_facet_context(self, facets, categories, sizes):
+        for category in categories:
+            category.facet_count = facets["category"].get(str(category.id), 0)
+        selected_sizes = self.request.GET.getlist("size")
+        for size in sizes:
+            size.facet_count = facets["size"].get(size.name, 0)
+            size.facet_url = self.facet_toggle_url("size", size.name)
+            size.selected = size.name in selected_sizes
+
+        selected_colors = {color.lower() for color in self.request.GET.getlist("color")}
+        colors = [
+            {
+                "name": color,
+                "count": count,
+                "url": self.facet_toggle_url("color", color),
+                "active": color in selected_colors,
+            }
+            for color, count in sorted(facets["color"].items())
+        ]
+
+        price_buckets = []
+        for index, (low, high) in enumerate(price_bucket_ranges()):
+            count = facets["price"].get(str(index), 0)
+            if not count:
+                continue
+            price_buckets.append(
+                {
+                    "label": f"${low} - ${high}" if high else f"${low}+",
+                    "count": count,
+                    "url": self.facet_url(
+                        min_price=low, max_price=high - 0.01 if high else None
+                    ),
+                }
+            )
+
+        querystring = self.facet_url().split("?", 1)[1]
+        return {
+            "facet_colors": colors,
+            "facet_price_buckets": price_buckets,
+            "facet_querystring": querystring,
+            "in_stock_url": self.facet_url(
+                in_stock=None if self.request.GET.get("in_stock") else "1"
+            ),
+        }
+
+    def paginate_products(self, products, ordering):
+        # Keyset-пагінація: сторінка завжди читає PAGE_SIZE + 1 рядків за індексом
+        paginator = KeysetPaginator(products, ordering, self.PAGE_SIZE)
+        # Курсор діє лише для HTMX-довантаження; повна сторінка (закладка, оновлення)
+        # завжди починається з першої сторінки з підрахунком
+        cursor = None
+        if self.get_fragment() == "products":
+            cursor = self.request.GET.get("cursor")
+        try:
+            page, next_cursor = paginator.get_page(cursor)
+        except InvalidCursor:
+            cursor = None
+            page, next_cursor = paginator.get_page()
+
+        context = {"products": page}
+        if next_cursor:
+            params = self.request.GET.copy()
+            params["cursor"] = next_cursor
+            context["next_page_url"] = f"{self.request.path}?{params.urlencode()}"
+
+        # Підрахунок окремим запитом і тільки для першої сторінки
+        if not cursor:
+            total_count, is_estimate = count_products(products)
+            context["total_count"] = total_count
+            context["total_count_is_estimate"] = is_estimate
+        return context
+
+    # Який шматок сторінки потрібен HTMX (або "page" для повної сторінки)
+    def get_fragment(self):
+        if not self.request.headers.get("Hx-Request"):
+            return "page"
+        if self.request.GET.get("show_search") == "true":
+            return "search_input"
+        if self.request.GET.get("reset_search") == "true":
+            return "search_button"
+        if self.request.GET.get("show_filters") == "true":
+            return "filters"
+        if self.request.GET.get("cursor"):
+            return "products"
+        return "page"
+
+    def render_fragment(self, fragment, **kwargs):
+        # Ключ: категорія, нормалізовані GET-параметри, тип фрагмента і версія каталогу
+        key = catalog_cache_key(
+            "response", kwargs.get("category_slug"), self.request.GET, fragment
+        )
+        content = cache.get(key)
+        record_cache_result(content is not None)
+        if content is None:
+            context = self.get_context_data(**kwargs)
+            content = render_to_string(
+                self.FRAGMENT_TEMPLATES[fragment], context, self.request
+            )
+            cache.set(key, content, RESPONSE_CACHE_TIMEOUT)
+        return content
+
     def get(self, request, *args, **kwargs):
-        context = self.get_context_data(**kwargs)
+        fragment = self.get_fragment()
+        content = self.render_fragment(fragment, **kwargs)
 
         if request.headers.get("Hx-Request"):
-            context["base_template"] = "main/base_htmx.html"
-        else:
-            context["base_template"] = "main/base.html"
+            return HttpResponse(content)
 
-        if request.headers.get("Hx-Request"):
-            if context.get("show_search"):
-                return TemplateResponse(request, "main/search_input.html", context)
-            elif context.get("reset_search"):
-                return TemplateResponse(request, "main/search_button.html", {})
-            elif request.GET.get("show_filters") == "true":
-                return TemplateResponse(request, "main/filter_modal.html", context)
+        # Шапка з кошиком і csrf залежить від користувача, тому кешуємо лише вміст каталогу
+        context = {
+            "base_template": "main/base.html",
+            "catalog_content": mark_safe(content),
+        }
+        return TemplateResponse(request, self.template_name, context)
 
-            context["base_template"] = "main/base_htmx.html"
-            return TemplateResponse(request, self.template_name, context)
 
-        return TemplateResponse(request, self.template_name, context)
+class CatalogCacheMetricsView(View):
+    # Метрики бачать персонал або збирач із токеном (Authorization: Bearer ...)
+    def dispatch(self, request, *args, **kwargs):
+        token = settings.METRICS_TOKEN
+        auth = request.headers.get("Authorization", "")
+        if token and constant_time_compare(auth, f"Bearer {token}"):
+            return super().dispatch(request, *args, **kwargs)
+        return staff_member_required(super().dispatch)(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        stats = get_cache_stats()
+        lines = [
+            "# TYPE catalog_cache_hits_total counter",
+            f"catalog_cache_hits_total {stats['hit']}",
+            "# TYPE catalog_cache_misses_total counter",
+            f"catalog_cache_misses_total {stats['miss']}",
+        ]
+        return HttpResponse(
+            "\n".join(lines) + "\n", content_type="text/plain; version=0.0.4"
+        )
 
 
-class ProductDetailView(DetailView):
+class SearchSuggestionsView(View):
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get("q", "")
+        suggestions = []
+        for suggestion in get_suggestions(query):
+            if suggestion.kind == "product":
+                url = reverse("main:product_detail", args=[suggestion.value])
+            elif suggestion.kind == "category":
+                url = reverse("main:catalog", args=[suggestion.value])
+            else:
+                url = f"{reverse('main:catalog_all')}?{urlencode({'color': suggestion.value})}"
+            suggestions.append(
+                {"label": suggestion.label, "kind": suggestion.kind, "url": url}
+            )
+        context = {"suggestions": suggestions, "search_query": query}
+        return TemplateResponse(request, "main/search_suggestions.html", context)
+
+
+class ProductDetailView(ConditionalGetMixin, DetailView):
     model = Product
     template_name = "main/product_detail.html"
     slug_field = "slug"
     slug_url_kwarg = "slug"
+    RELATED_COUNT = 4
+
+    def get_queryset(self):
+        return Product.objects.select_related("category")
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        product = self.get_object()
-        context["categories"] = Category.objects.all()
-        context["related_products"] = Product.objects.filter(
-            category=product.category
-        ).exclude(id=product.id)[:4]
+        product = self.object
+        context["related_products"] = self.get_related_products(product)
         context["current_category"] = product.category
+        # Галерея і розміри рендеряться з кешу фрагмента; запити виконуються лише при промаху
+        context["images"] = product.images.all()
+        context["product_sizes"] = product.product_sizes.select_related("size")
+        context["product_version"] = get_product_version(product.pk)
+        context["fragment_cache_timeout"] = RESPONSE_CACHE_TIMEOUT
         return context
 
+    def get_related_products(self, product):
+        # Спочатку товари, які найчастіше купують разом із цим (індекс copurchase_top_idx)
+        related = [
+            co_purchase.related
+            for co_purchase in CoPurchase.objects.filter(product=product)
+            .select_related("related")
+            .order_by("-count", "related")[: self.RELATED_COUNT]
+        ]
+        # Решту добираємо з тієї ж категорії
+        if len(related) < self.RELATED_COUNT:
+            related += Product.objects.filter(category=product.category).exclude(
+                id__in=[product.id] + [item.id for item in related]
+            )[: self.RELATED_COUNT - len(related)]
+        return related
+
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
         context = self.get_context_data(**kwargs)
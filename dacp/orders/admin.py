@@ -49,7 +49,7 @@ class OrderAdmin(admin.ModelAdmin):
         "created_at",
         "updated_at",
     )
-    list_filter = ("status", "first_name", "last_name")
+    list_filter = ("status", "oversold", "first_name", "last_name")
     search_fields = ("email", "first_name", "last_name")
     date_hierarchy = "created_at"
     readonly_fields = (
@@ -57,6 +57,8 @@ class OrderAdmin(admin.ModelAdmin):
         "updated_at",
         "total_price",
         "stripe_payment_intent_id",
+        "stripe_session_id",
+        "oversold_size_ids",
     )
     inlines = [OrderItemInline]
 
@@ -87,8 +89,11 @@ class OrderAdmin(admin.ModelAdmin):
             {
                 "fields": (
                     "status",
+                    "oversold",
+                    "oversold_size_ids",
                     "payment_provider",
                     "stripe_payment_intent_id",
+                    "stripe_session_id",
                 )
             },
         ),
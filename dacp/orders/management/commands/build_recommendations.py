@@ -0,0 +1,103 @@
+from collections import Counter, defaultdict
+from itertools import permutations
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from main.cache import bump_catalog_version
+from main.models import CoPurchase
+from orders.models import Order, OrderItem
+
+# Лічильник збільшується в самій базі: паралельні запуски не перетирають один одного
+UPSERT_PAIRS_SQL = """
+INSERT INTO main_copurchase (product_id, related_id, count)
+SELECT * FROM unnest(
+    %(product_ids)s::bigint[], %(related_ids)s::bigint[], %(counts)s::integer[]
+)
+ON CONFLICT (product_id, related_id)
+DO UPDATE SET count = main_copurchase.count + EXCLUDED.count
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Counts products bought together in paid orders (main.CoPurchase). "
+        "Only orders that were not indexed yet are processed unless --full is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--full", action="store_true", help="Drop all counts and rebuild them."
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        if options["full"]:
+            with transaction.atomic():
+                CoPurchase.objects.all().delete()
+                Order.objects.filter(recommendations_indexed=True).update(
+                    recommendations_indexed=False
+                )
+
+        last_id = 0
+        total_orders = 0
+        total_pairs = 0
+
+        while True:
+            with transaction.atomic():
+                # Замовлення, які вже взяв інший запуск, пропускаємо
+                order_ids = list(
+                    Order.objects.select_for_update(skip_locked=True)
+                    .filter(
+                        pk__gt=last_id,
+                        recommendations_indexed=False,
+                        status__in=Order.PAID_STATUSES,
+                    )
+                    .order_by("pk")
+                    .values_list("pk", flat=True)[:batch_size]
+                )
+                if not order_ids:
+                    break
+                total_pairs += self.index_orders(order_ids)
+            total_orders += len(order_ids)
+            last_id = order_ids[-1]
+
+        # Сторінки товарів показують нові рекомендації
+        if total_orders:
+            bump_catalog_version()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {total_orders} orders, updated {total_pairs} product pairs"
+            )
+        )
+
+    def index_orders(self, order_ids):
+        baskets = defaultdict(set)
+        items = OrderItem.objects.filter(order_id__in=order_ids).values_list(
+            "order_id", "product_id"
+        )
+        for order_id, product_id in items:
+            baskets[order_id].add(product_id)
+
+        # Розріджена матриця співпокупок батчу: {(товар, інший товар): кількість}
+        pairs = Counter()
+        for products in baskets.values():
+            pairs.update(permutations(products, 2))
+
+        if pairs:
+            # Сортування дає однаковий порядок блокувань рядків у паралельних запусках
+            lines = sorted(pairs.items())
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    UPSERT_PAIRS_SQL,
+                    {
+                        "product_ids": [pair[0] for pair, _ in lines],
+                        "related_ids": [pair[1] for pair, _ in lines],
+                        "counts": [count for _, count in lines],
+                    },
+                )
+
+        Order.objects.filter(pk__in=order_ids).update(recommendations_indexed=True)
+        return len(pairs)
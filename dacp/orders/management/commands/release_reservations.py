@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from orders.models import Order, StockReservation
+
+
+class Command(BaseCommand):
+    help = (
+        "Releases expired stock reservations in batches and cancels the unpaid "
+        "orders they belonged to. Rows locked by a running checkout or webhook "
+        "are skipped until the next run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        released_orders = 0
+        batch = 0
+
+        while True:
+            started = time.monotonic()
+            with transaction.atomic():
+                order_ids = StockReservation.objects.release_expired(batch_size)
+                if not order_ids:
+                    break
+                # update() без сигналів: резерви вже звільнено
+                cancelled = Order.objects.filter(
+                    pk__in=order_ids, status="pending"
+                ).update(status="cancelled")
+            batch += 1
+            released_orders += len(order_ids)
+            self.stdout.write(
+                f"batch {batch}: {len(order_ids)} orders released, {cancelled} cancelled "
+                f"in {time.monotonic() - started:.3f}s"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Released reservations of {released_orders} orders")
+        )
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0002_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="recommendations_indexed",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("recommendations_indexed", False)),
+                fields=["id"],
+                name="order_unindexed_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0004_stock_reservation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="stripe_session_id",
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0005_order_stripe_session_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="oversold",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:13
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0006_order_oversold"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="oversold_size_ids",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.IntegerField(), blank=True, default=list, size=None
+            ),
+        ),
+    ]
@@ -1,6 +1,63 @@
-from django.db import models
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, models, transaction
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.utils import timezone
 from main.models import Product, ProductSize
+from main.signals import schedule_stock_refresh
+
+
+class OutOfStock(Exception):
+    def __init__(self, lines):
+        self.lines = lines
+        super().__init__(
+            "Not enough stock for: "
+            + ", ".join(
+                f"{line.product.name} ({line.product_size.size.name}), "
+                f"{line.product_size.available} left"
+                for line in lines
+            )
+        )
+
+
+class OrderManager(models.Manager):
+    # Замовлення з кошика: рядки разом з цінами й залишками беруться одним запитом
+    # (знімок кошика), позиції пишуться одним bulk_create.
+    # Кількість запитів не залежить від кількості рядків
+    def create_from_cart(self, cart, **fields):
+        lines = cart.get_items()
+        short = [line for line in lines if line.quantity > line.product_size.available]
+        if short:
+            raise OutOfStock(short)
+
+        total_price = sum(
+            (line.product.price * line.quantity for line in lines), Decimal("0")
+        )
+        with transaction.atomic():
+            order = self.create(total_price=total_price, **fields)
+            OrderItem.objects.bulk_create(
+                [
+                    OrderItem(
+                        order=order,
+                        product=line.product,
+                        size=line.product_size,
+                        quantity=line.quantity,
+                        price=line.product.price,
+                    )
+                    for line in lines
+                ]
+            )
+            # Резерв — остаточна перевірка: паралельне замовлення могло встигнути першим
+            reserved = StockReservation.objects.reserve(
+                order, {line.product_size.id: line.quantity for line in lines}
+            )
+            if len(reserved) < len(lines):
+                raise OutOfStock(
+                    [line for line in lines if line.product_size.id not in reserved]
+                )
+        return order
 
 
 # Create your models here.
@@ -13,6 +70,8 @@ class Order(models.Model):
         ("cancelled", "Cancelled"),
     )
     PAYMENT_PROVIDER_CHOICES = (("stripe", "Stripe"),)
+    # Статуси, у яких замовлення вже оплачене
+    PAID_STATUSES = ("processing", "shipped", "delivered")
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="orders"
     )
@@ -36,12 +95,80 @@ class Order(models.Model):
     )
     # Унікальний ключ який генерується при оплаті для перевірки
     stripe_payment_intent_id = models.CharField(max_length=255, blank=True, null=True)
+    # Сесія Stripe Checkout; за нею сторінка успіху знаходить замовлення без запиту до Stripe
+    stripe_session_id = models.CharField(
+        max_length=255, unique=True, blank=True, null=True
+    )
+    # Оплачено більше, ніж було на складі: замовлення потребує ручного розбору.
+    # oversold_size_ids — розміри, які не списано; при скасуванні їх не повертаємо
+    oversold = models.BooleanField(default=False)
+    oversold_size_ids = ArrayField(models.IntegerField(), default=list, blank=True)
+    # Чи враховане замовлення в таблиці "разом купують" (main.CoPurchase)
+    recommendations_indexed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(recommendations_indexed=False),
+                name="order_unindexed_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.email}"
 
+    # Списання товару після оплати. Зазвичай це утримані резерви; якщо їх уже
+    # звільнено, позиції списуються одним UPDATE ... FROM (VALUES ...).
+    # Розміри, яких не вистачило, записуються в замовлення і повертаються;
+    # їхній залишок не змінюється
+    def deduct_stock(self):
+        if StockReservation.objects.commit(self):
+            return []
+
+        lines = self._stock_lines()
+        if not lines:
+            return []
+        rows = self._update_stock(DEDUCT_STOCK_SQL, lines)
+        deducted = {size_id for size_id, _ in rows}
+        short = [size_id for size_id, _ in lines if size_id not in deducted]
+        if short:
+            Order.objects.filter(pk=self.pk).update(
+                oversold=True, oversold_size_ids=short
+            )
+        return short
+
+    # Скасування оплаченого замовлення: повертаємо на склад лише те, що справді
+    # списали, тобто без розмірів з oversold_size_ids
+    def restore_stock(self):
+        short = set(self.oversold_size_ids)
+        lines = [line for line in self._stock_lines() if line[0] not in short]
+        if lines:
+            self._update_stock(RESTORE_STOCK_SQL, lines)
+        return lines
+
+    # [(id розміру, кількість)] позицій замовлення
+    def _stock_lines(self):
+        return list(
+            self.items.order_by()
+            .values_list("size_id")
+            .annotate(quantity=models.Sum("quantity"))
+        )
+
+    def _update_stock(self, sql, lines):
+        values = ", ".join(["(%s::integer, %s::integer)"] * len(lines))
+        params = [value for line in lines for value in line]
+        with connection.cursor() as cursor:
+            cursor.execute(sql.format(values=values), params)
+            rows = cursor.fetchall()
+        # raw UPDATE не викликає post_save ProductSize: вітрину й кеші оновлюємо самі
+        schedule_stock_refresh({product_id for _, product_id in rows})
+        return rows
+
 
 # Для того щоб було видно скільки коштує то чи інший товар
 class OrderItem(models.Model):
@@ -56,3 +183,146 @@ class OrderItem(models.Model):
 
     def get_total_price(self):
         return self.price * self.quantity
+
+
+# Перевірка stock >= quantity разом з CHECK (stock >= 0) поля не дає піти в мінус
+DEDUCT_STOCK_SQL = """
+UPDATE main_productsize ps
+SET stock = ps.stock - line.quantity
+FROM (VALUES {values}) AS line(size_id, quantity)
+WHERE ps.id = line.size_id AND ps.stock >= line.quantity
+RETURNING ps.id, ps.product_id
+"""
+
+# Повернення позицій скасованого замовлення на склад
+RESTORE_STOCK_SQL = """
+UPDATE main_productsize ps
+SET stock = ps.stock + line.quantity
+FROM (VALUES {values}) AS line(size_id, quantity)
+WHERE ps.id = line.size_id
+RETURNING ps.id, ps.product_id
+"""
+
+# Умовний UPDATE: резерв проходить лише там, де вільного залишку вистачає.
+# Рядок ProductSize блокується лише на час цього оператора і до кінця транзакції
+RESERVE_SQL = """
+UPDATE main_productsize ps
+SET reserved = ps.reserved + line.quantity
+FROM unnest(%(size_ids)s::integer[], %(quantities)s::integer[])
+    AS line(size_id, quantity)
+WHERE ps.id = line.size_id AND ps.stock - ps.reserved >= line.quantity
+RETURNING ps.id, ps.product_id
+"""
+
+# Видаляє резерви і повертає їхню кількість у вільний залишок. Для оплачених
+# замовлень (commit) кількість ще й списується зі stock. Без обрізання до нуля:
+# розбіжність резервів і залишку має впасти на CHECK (>= 0), а не зникнути тихо
+RELEASE_SQL = """
+WITH released AS (
+    DELETE FROM orders_stockreservation r
+    USING (
+        SELECT id FROM orders_stockreservation
+        WHERE {condition}
+        ORDER BY id
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ) picked
+    WHERE r.id = picked.id
+    RETURNING r.order_id, r.product_size_id, r.quantity
+),
+sizes AS (
+    UPDATE main_productsize ps
+    SET reserved = ps.reserved - line.quantity,
+        stock = CASE WHEN %(commit)s
+            THEN ps.stock - line.quantity
+            ELSE ps.stock
+        END
+    FROM (
+        SELECT product_size_id, SUM(quantity) AS quantity
+        FROM released
+        GROUP BY product_size_id
+    ) line
+    WHERE ps.id = line.product_size_id
+    RETURNING ps.product_id
+)
+SELECT
+    ARRAY(SELECT DISTINCT order_id FROM released),
+    ARRAY(SELECT DISTINCT product_id FROM sizes)
+"""
+
+
+class StockReservationManager(models.Manager):
+    # lines: {id розміру: кількість}. Повертає id розмірів, які вдалося зарезервувати
+    def reserve(self, order, lines):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                RESERVE_SQL,
+                {"size_ids": list(lines), "quantities": list(lines.values())},
+            )
+            rows = cursor.fetchall()
+        reserved = {size_id for size_id, _ in rows}
+        # Вільний залишок змінився: вітрина, фрагменти розмірів і каталог оновлюються
+        schedule_stock_refresh({product_id for _, product_id in rows})
+        expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+        self.bulk_create(
+            [
+                StockReservation(
+                    order=order,
+                    product_size_id=size_id,
+                    quantity=quantity,
+                    expires_at=expires_at,
+                )
+                for size_id, quantity in lines.items()
+                if size_id in reserved
+            ]
+        )
+        return reserved
+
+    def _release(self, condition, params, commit=False, limit=None):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                RELEASE_SQL.format(condition=condition),
+                {**params, "commit": commit, "limit": limit},
+            )
+            order_ids, product_ids = cursor.fetchone()
+        # raw UPDATE не викликає post_save ProductSize: вітрину й кеші оновлюємо самі
+        schedule_stock_refresh(product_ids)
+        return order_ids
+
+    # Оплата: резерви замовлення списуються зі stock. Повертає False, якщо резервів
+    # уже немає (прострочені й звільнені), тоді списувати доводиться без них
+    def commit(self, order):
+        return bool(
+            self._release(
+                "order_id = %(order_id)s", {"order_id": order.pk}, commit=True
+            )
+        )
+
+    def release(self, order):
+        return bool(self._release("order_id = %(order_id)s", {"order_id": order.pk}))
+
+    # Для release_reservations: одна пачка прострочених резервів, які ніхто не тримає.
+    # Повертає id замовлень, чиї резерви звільнено
+    def release_expired(self, limit):
+        return self._release(
+            "expires_at < %(now)s", {"now": timezone.now()}, limit=limit
+        )
+
+
+class StockReservation(models.Model):
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="reservations"
+    )
+    product_size = models.ForeignKey(ProductSize, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    objects = StockReservationManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["expires_at"], name="reservation_expires_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_size_id} for order {self.order_id}"
@@ -1,6 +1,10 @@
-from django.db.models.signals import pre_save
+import logging
+
+from django.db.models.signals import pre_delete, pre_save
 from django.dispatch import receiver
-from .models import Order
+from .models import Order, StockReservation
+
+logger = logging.getLogger(__name__)
 
 # Використовуємо signals для того, щоб була при поверненні товару і вибору у адмінці статусу Cancelled, кількість товару що була замовлена, повернулась до бд
 
@@ -15,18 +19,26 @@ def restore_stock_on_cancel(sender, instance, **kwargs):
     except Order.DoesNotExist:
         return
 
+    # Неоплачене замовлення скасовано: звільняємо утриманий товар
+    if instance.status == "cancelled" and old_order.status == "pending":
+        StockReservation.objects.release(instance)
+
     # ЕсЯкщо статус змінився на Cancelled
     if instance.status == "cancelled" and old_order.status != "cancelled":
-        # Якщо товар уже був списаний до цього (статус був processing, shipped)
+        # Якщо товар уже був списаний до цього (статус був processing, shipped).
+        # Розміри, яких не вистачило при оплаті (oversold), не списувались і не повертаються
         if old_order.status in ["processing", "shipped", "delivered"]:
-            print(f"Restoring stock for Order #{instance.id}...")
-
-            for item in instance.items.all():
-                product_size = item.size
-
-                product_size.stock += item.quantity
-                product_size.save()
-
-                print(
-                    f"Returned {item.quantity} of {item.product.name} ({product_size.size.name}) to stock."
-                )
+            lines = old_order.restore_stock()
+            logger.info(
+                "Restored stock for order %s: %s",
+                instance.id,
+                ", ".join(
+                    f"{quantity} of size {size_id}" for size_id, quantity in lines
+                ),
+            )
+
+
+# Резерви видаляються каскадом, тож спершу повертаємо їх у вільний залишок
+@receiver(pre_delete, sender=Order)
+def release_stock_on_delete(sender, instance, **kwargs):
+    StockReservation.objects.release(instance)
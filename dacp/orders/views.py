@@ -1,17 +1,17 @@
 from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.utils.decorators import method_decorator
 from django.http import HttpResponse
 from django.template.response import TemplateResponse
 from django.views.generic import View
 from .forms import OrderForm
-from .models import Order, OrderItem
+from .models import Order, OutOfStock
 from cart.views import CartMixin
 from cart.models import Cart
 from main.models import ProductSize
 from django.shortcuts import get_object_or_404
-from decimal import Decimal
 from payment.views import create_stripe_checkout_session
 import logging
 
@@ -20,6 +20,9 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+# Без ATOMIC_REQUESTS: замовлення комітиться у create_from_cart, а запит до Stripe
+# виконується вже поза транзакцією
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
 @method_decorator(login_required(login_url="/users/login"), name="dispatch")
 class CheckoutView(CartMixin, View):
     def get(self, request):
@@ -43,9 +46,7 @@ class CheckoutView(CartMixin, View):
         context = {
             "form": form,
             "cart": cart,
-            "cart_items": cart.items.select_related(
-                "product", "product_size__size"
-            ).order_by("-added_at"),
+            "cart_items": cart.get_items(),
             "total_price": total_price,
         }
 
@@ -72,9 +73,7 @@ class CheckoutView(CartMixin, View):
             context = {
                 "form": OrderForm(user=request.user),
                 "cart": cart,
-                "cart_items": cart.items.select_related(
-                    "product", "product_size__size"
-                ).order_by("-added_at"),
+                "cart_items": cart.get_items(),
                 "total_price": cart.subtotal,
                 "error_message": "Please select a valid payment provider (Stripe or Heleket).",
             }
@@ -94,34 +93,39 @@ class CheckoutView(CartMixin, View):
 
         # Сам заказ
         if form.is_valid():
-            order = Order.objects.create(
-                user=request.user,
-                first_name=form.cleaned_data["first_name"],
-                last_name=form.cleaned_data["last_name"],
-                email=form.cleaned_data["email"],
-                company=form.cleaned_data["company"],
-                address1=form.cleaned_data["address1"],
-                address2=form.cleaned_data["address2"],
-                city=form.cleaned_data["city"],
-                country=form.cleaned_data["country"],
-                province=form.cleaned_data["province"],
-                postal_code=form.cleaned_data["postal_code"],
-                phone=form.cleaned_data["phone"],
-                special_instructions="",
-                total_price=total_price,
-                payment_provider=payment_provider,
-            )
-            for item in cart.items.select_related("product", "product_size__size"):
-                logger.debug(
-                    f"Processing cart item: product={item.product.name}, size={item.product_size.size.name}, quantity={item.quantity}"
-                )
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    size=item.product_size,
-                    quantity=item.quantity,
-                    price=item.product.price or Decimal("0.00"),
+            try:
+                order = Order.objects.create_from_cart(
+                    cart,
+                    user=request.user,
+                    first_name=form.cleaned_data["first_name"],
+                    last_name=form.cleaned_data["last_name"],
+                    email=form.cleaned_data["email"],
+                    company=form.cleaned_data["company"],
+                    address1=form.cleaned_data["address1"],
+                    address2=form.cleaned_data["address2"],
+                    city=form.cleaned_data["city"],
+                    country=form.cleaned_data["country"],
+                    province=form.cleaned_data["province"],
+                    postal_code=form.cleaned_data["postal_code"],
+                    phone=form.cleaned_data["phone"],
+                    special_instructions="",
+                    payment_provider=payment_provider,
                 )
+            except OutOfStock as e:
+                logger.warning(f"Checkout stock error: {e}")
+                context = {
+                    "form": form,
+                    "cart": cart,
+                    "cart_items": cart.get_items(),
+                    "total_price": total_price,
+                    "error_message": str(e),
+                }
+                if request.headers.get("HX-Request"):
+                    return TemplateResponse(
+                        request, "orders/checkout_content.html", context
+                    )
+                return render(request, "orders/checkout.html", context)
+            logger.debug(f"Created order {order.id} with total {order.total_price}")
 
             # Спроба ініціалізації платіжної системи
             try:
@@ -146,9 +150,7 @@ class CheckoutView(CartMixin, View):
                 context = {
                     "form": form,
                     "cart": cart,
-                    "cart_items": cart.items.select_related(
-                        "product", "product_size__size"
-                    ).order_by("-added_at"),
+                    "cart_items": cart.get_items(),
                     "total_price": total_price,
                     "error_message": f"Payment processiong error: {str(e)}",
                 }
@@ -164,9 +166,7 @@ class CheckoutView(CartMixin, View):
             context = {
                 "form": form,
                 "cart": cart,
-                "cart_items": cart.items.select_related(
-                    "product", "product_size__size"
-                ).order_by("-added_at"),
+                "cart_items": cart.get_items(),
                 "total_price": total_price,
                 "error_message": f"Please correct the errors on the form.",
             }
@@ -0,0 +1,93 @@
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+# Локальний фейковий Stripe для тестів: вміє створювати й повертати Checkout Session.
+# with FakeStripeServer() as server: stripe.api_base = server.url
+class FakeStripeServer:
+    def __init__(self):
+        self.sessions = {}
+        # (метод, шлях, параметри) кожного запиту
+        self.requests = []
+
+    def __enter__(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class())
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+    def create_session(self, params):
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"{self.url}/pay/{session_id}",
+            "status": "open",
+            "payment_status": "unpaid",
+            "payment_intent": None,
+            "success_url": params.get("success_url"),
+            "cancel_url": params.get("cancel_url"),
+            "expires_at": int(params.get("expires_at", time.time() + 24 * 3600)),
+            # metadata[order_id]=5 -> {"order_id": "5"}
+            "metadata": {
+                match.group(1): value
+                for key, value in params.items()
+                if (match := re.fullmatch(r"metadata\[(\w+)\]", key))
+            },
+        }
+        self.sessions[session_id] = session
+        return 200, session
+
+    def dispatch(self, method, path, params):
+        self.requests.append((method, path, params))
+        if method == "POST" and path == "/v1/checkout/sessions":
+            return self.create_session(params)
+        match = re.fullmatch(r"/v1/checkout/sessions/(\w+)", path)
+        if method == "GET" and match and match.group(1) in self.sessions:
+            return 200, self.sessions[match.group(1)]
+        return 404, {
+            "error": {
+                "type": "invalid_request_error",
+                "message": f"No such resource: {path}",
+            }
+        }
+
+    def handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.respond("GET")
+
+            def do_POST(self):
+                self.respond("POST")
+
+            def respond(self, method):
+                path, _, query = self.path.partition("?")
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode() if length else query
+                status, data = server.dispatch(method, path, dict(parse_qsl(body)))
+
+                content = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.send_header("Request-Id", f"req_{uuid.uuid4().hex}")
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,79 @@
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from payment.models import StripeEvent
+from payment.webhooks import handle_event
+
+
+class Command(BaseCommand):
+    help = (
+        "Processes stored Stripe webhook events in batches. Several workers can run "
+        "at once: each event is locked with FOR UPDATE SKIP LOCKED and handled in "
+        "its own transaction. Failed events are retried with exponential backoff."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for new events instead of exiting when none are due.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1,
+            help="Seconds to wait between polls in --loop mode.",
+        )
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        batch = 0
+
+        while True:
+            started = time.monotonic()
+            handled = 0
+            # Кожна подія — окрема транзакція: блокування рядків складу, взяті під час
+            # обробки, знімаються одразу, а не після всієї пачки
+            for pk in StripeEvent.objects.due_ids(options["batch_size"]):
+                with transaction.atomic():
+                    event = StripeEvent.objects.claim(pk)
+                    if event is None:
+                        continue
+                    # Savepoint: помилка відкочує лише зміни обробника, не позначку події
+                    try:
+                        with transaction.atomic():
+                            handle_event(event.payload)
+                    except Exception:
+                        event.mark_failed(traceback.format_exc())
+                        failed += 1
+                    else:
+                        event.mark_processed()
+                        processed += 1
+                    event.save(
+                        update_fields=[
+                            "status",
+                            "attempts",
+                            "next_attempt_at",
+                            "last_error",
+                            "processed_at",
+                        ]
+                    )
+                handled += 1
+
+            if handled:
+                batch += 1
+                self.stdout.write(
+                    f"batch {batch}: {handled} events "
+                    f"in {time.monotonic() - started:.3f}s"
+                )
+            elif options["loop"]:
+                time.sleep(options["sleep"])
+            else:
+                break
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Processed {processed} events, {failed} failed")
+        )
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:53
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+# Події, отримані до появи черги, вебхук уже обробив синхронно
+def mark_received_processed(apps, schema_editor):
+    StripeEvent = apps.get_model("payment", "StripeEvent")
+    StripeEvent.objects.update(status="processed", processed_at=F("received_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payment", "0001_stripe_event"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stripeevent",
+            name="attempts",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="stripeevent",
+            name="last_error",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="stripeevent",
+            name="next_attempt_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name="stripeevent",
+            name="payload",
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name="stripeevent",
+            name="processed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="stripeevent",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("processed", "Processed"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stripeevent",
+            index=models.Index(
+                fields=["status", "next_attempt_at"], name="stripe_event_due_idx"
+            ),
+        ),
+        migrations.RunPython(mark_received_processed, migrations.RunPython.noop),
+    ]
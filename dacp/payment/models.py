@@ -1,3 +1,78 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+class StripeEventManager(models.Manager):
+    # INSERT ... ON CONFLICT DO NOTHING: повторна доставка тієї ж події нічого не змінює
+    def receive(self, event):
+        self.bulk_create(
+            [StripeEvent(event_id=event["id"], type=event["type"], payload=event)],
+            ignore_conflicts=True,
+        )
+
+    def due(self):
+        return self.filter(status="pending", next_attempt_at__lte=timezone.now())
+
+    # id пачки подій, готових до обробки (без блокувань)
+    def due_ids(self, limit):
+        return list(
+            self.due()
+            .order_by("next_attempt_at", "pk")
+            .values_list("pk", flat=True)[:limit]
+        )
+
+    # Блокує одну подію до кінця поточної транзакції. None — її вже взяв інший
+    # воркер або вона вже оброблена, тож воркерів можна запускати кілька.
+    # Викликати всередині transaction.atomic()
+    def claim(self, pk):
+        return self.due().select_for_update(skip_locked=True).filter(pk=pk).first()
+
+
+# Вхідні події Stripe: вебхук лише зберігає їх, обробляє process_stripe_events
+class StripeEvent(models.Model):
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("processed", "Processed"),
+        ("failed", "Failed"),
+    )
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = StripeEventManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"], name="stripe_event_due_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
+
+    def mark_processed(self):
+        self.status = "processed"
+        self.processed_at = timezone.now()
+        self.last_error = ""
 
-# Create your models here.
+    # Експоненційна затримка між спробами; після STRIPE_EVENT_MAX_ATTEMPTS подія
+    # лишається в статусі failed для ручного розбору
+    def mark_failed(self, error):
+        self.attempts += 1
+        self.last_error = error
+        if self.attempts >= settings.STRIPE_EVENT_MAX_ATTEMPTS:
+            self.status = "failed"
+            return
+        delay = settings.STRIPE_EVENT_RETRY_DELAY * 2 ** (self.attempts - 1)
+        self.next_attempt_at = timezone.now() + timedelta(seconds=delay)
@@ -1,3 +1,119 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
+
+import stripe
+from django.db import connection
+from django.test import TransactionTestCase
+from django.urls import reverse
+from main.models import Category, Product, ProductSize, Size
+from orders.models import Order
+from users.models import CustomUser
+from .fake_stripe import FakeStripeServer
+
 
 # Create your tests here.
+class StripeCheckoutTests(TransactionTestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Shirts", slug="shirts")
+        self.product = Product.objects.create(
+            name="Shirt",
+            slug="shirt",
+            category=category,
+            color="Red",
+            price=Decimal("10.00"),
+            main_image="products/shirt.jpg",
+        )
+        self.size = ProductSize.objects.create(
+            product=self.product, size=Size.objects.create(name="M"), stock=5
+        )
+        self.user = CustomUser.objects.create(
+            email="buyer@example.com", first_name="Test", last_name="Buyer"
+        )
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse("cart:add_to_cart", args=[self.product.slug]),
+            {"size_id": self.size.id, "quantity": 2},
+        )
+
+        self.stripe = FakeStripeServer().__enter__()
+        self.addCleanup(self.stripe.__exit__, None, None, None)
+        patcher = mock.patch.multiple(
+            stripe, api_base=self.stripe.url, api_key="sk_test_fake"
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def checkout(self):
+        return self.client.post(
+            reverse("orders:checkout"),
+            {
+                "first_name": "Test",
+                "last_name": "Buyer",
+                "email": self.user.email,
+                "payment_provider": "stripe",
+            },
+        )
+
+    def test_session_is_created_after_the_order_is_committed(self):
+        create = stripe.checkout.Session.create
+        in_transaction = []
+
+        def create_session(**params):
+            in_transaction.append(connection.in_atomic_block)
+            return create(**params)
+
+        with mock.patch.object(stripe.checkout.Session, "create", create_session):
+            response = self.checkout()
+
+        order = Order.objects.get()
+        session = self.stripe.sessions[order.stripe_session_id]
+        self.assertRedirects(response, session["url"], fetch_redirect_response=False)
+        self.assertEqual(in_transaction, [False])
+        self.assertEqual(session["metadata"], {"order_id": str(order.id)})
+        self.assertTrue(session["cancel_url"].endswith(f"?order_id={order.id}"))
+
+    def test_success_page_does_not_call_stripe(self):
+        self.checkout()
+        order = Order.objects.get()
+        requests = len(self.stripe.requests)
+
+        response = self.client.get(
+            reverse("payment:stripe_success"), {"session_id": order.stripe_session_id}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["order"], order)
+        self.assertEqual(len(self.stripe.requests), requests)
+
+    def test_success_page_only_shows_own_order(self):
+        self.checkout()
+        order = Order.objects.get()
+        success_url = reverse("payment:stripe_success")
+        params = {"session_id": order.stripe_session_id}
+
+        self.client.logout()
+        response = self.client.get(success_url, params)
+        self.assertEqual(response.status_code, 302)
+
+        self.client.force_login(CustomUser.objects.create(email="other@example.com"))
+        response = self.client.get(success_url, params)
+        self.assertEqual(response.status_code, 404)
+
+    def test_cancel_only_touches_own_pending_order(self):
+        self.checkout()
+        order = Order.objects.get()
+        cancel_url = reverse("payment:stripe_cancel")
+
+        self.client.force_login(CustomUser.objects.create(email="other@example.com"))
+        response = self.client.get(cancel_url, {"order_id": order.id})
+        self.assertEqual(response.status_code, 404)
+
+        self.client.force_login(self.user)
+        Order.objects.filter(pk=order.pk).update(status="processing")
+        self.client.get(cancel_url, {"order_id": order.id})
+        order.refresh_from_db()
+        self.assertEqual(order.status, "processing")
+
+        Order.objects.filter(pk=order.pk).update(status="pending")
+        self.client.get(cancel_url, {"order_id": order.id})
+        order.refresh_from_db()
+        self.assertEqual(order.status, "cancelled")
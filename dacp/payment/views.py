@@ -5,14 +5,17 @@ from django.conf import settings
 from django.shortcuts import redirect, get_object_or_404, render
 from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed
 from django.template.response import TemplateResponse
+from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from orders.models import Order
+from .models import StripeEvent
 from cart.views import CartMixin
 from decimal import Decimal
 import json
 import hashlib
 import base64
+import time
 
 # Create your views here.
 # Для підключення stripe ввести у консоль cmd команду(перед цим зайти у папку де є stripe.exe):
@@ -21,44 +24,50 @@ import base64
 
 # Підключаємо stipe, інфа з сеттінгс
 stripe.api_key = settings.STRIPE_SECRET_KEY
+stripe.api_base = settings.STRIPE_API_BASE
+stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+# Один клієнт на процес: з'єднання з API перевикористовуються, таймаути жорсткі
+stripe.default_http_client = stripe.RequestsClient(timeout=settings.STRIPE_TIMEOUT)
 stripe_endpoint_secret = settings.STRIPE_WEBHOOK_SECRET
 
 
-# Метод для створення платіжної сесії на замовлення
+# Метод для створення платіжної сесії на замовлення.
+# Викликається поза транзакцією, коли замовлення вже збережене: поки йде запит
+# до Stripe, не тримаються ні блокування рядків, ні транзакція з'єднання
 def create_stripe_checkout_session(order, request):
-    cart = CartMixin().get_cart(request)
     line_items = []
-    for item in cart.items.select_related("product", "product_size"):
-        # Продивляємо всі товари у нашій корзині
+    for item in order.items.select_related("product", "size__size"):
+        # Продивляємо всі товари замовлення
         line_items.append(
             {
                 "price_data": {
                     "currency": "uah",
                     "product_data": {
-                        "name": f"{item.product.name} - {item.product_size.size.name}",
+                        "name": f"{item.product.name} - {item.size.size.name}",
                     },
-                    "unit_amount": int(item.product.price * 100),
+                    "unit_amount": int(item.price * 100),
                 },
                 "quantity": item.quantity,
             }
         )
-    try:
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=line_items,
-            mode="payment",
-            success_url=request.build_absolute_uri("/payment/stripe/success/")
-            + "?session_id={CHECKOUT_SESSION_ID}",
-            cancel_url=request.build_absolute_uri("/payment/stripe/cancel/")
-            + f"order_id={order.id}",
-            metadata={"order_id": order.id},
-        )
-        order.stripe_payment_intent_id = checkout_session.payment_intent
-        order.payment_provider = "stripe"
-        order.save()
-        return checkout_session
-    except Exception as e:
-        raise
+    checkout_session = stripe.checkout.Session.create(
+        payment_method_types=["card"],
+        line_items=line_items,
+        mode="payment",
+        success_url=request.build_absolute_uri("/payment/stripe/success/")
+        + "?session_id={CHECKOUT_SESSION_ID}",
+        cancel_url=request.build_absolute_uri("/payment/stripe/cancel/")
+        + f"?order_id={order.id}",
+        metadata={"order_id": order.id},
+        # Сесія закривається раніше, ніж звільняється резерв товару
+        expires_at=int(time.time()) + settings.STRIPE_SESSION_TTL,
+        # Повторна спроба після таймауту не створить другу сесію
+        idempotency_key=f"checkout-order-{order.id}",
+    )
+    # Одне UPDATE в autocommit
+    Order.objects.filter(pk=order.pk).update(stripe_session_id=checkout_session.id)
+    order.stripe_session_id = checkout_session.id
+    return checkout_session
 
 
 @csrf_exempt
@@ -78,69 +87,47 @@ def stripe_webhook(request):
     except stripe.error.SignatureVerificationError as e:
         return HttpResponse(status=400)
 
-    # Якщо stripe відправиви інфу що ьула оплата, відбуваєтсь ініціалізація сесії і витяг даних і їх зміна
-    if event["type"] == "checkout.session.completed":
-        session = event["data"]["object"]
-        order_id = session["metadata"].get("order_id")
-        try:
-            order = Order.objects.get(id=order_id)
-            order.status = "processing"
-            order.stripe_payment_intent_id = session.get("payment_intent")
-            order.save()
-
-            for item in order.items.all():
-                product_size = item.size
-
-                # Перевіряємо, чи є ще товар (про всяк випадок)
-                if product_size.stock >= item.quantity:
-                    product_size.stock -= item.quantity
-                    product_size.save()
-                else:
-                    # Логіруємо проблему: якщо хтось купив товару більше, ніж було
-                    print(
-                        f"WARNING: Order {order.id} bought {item.quantity} of {product_size}, but stock was {product_size.stock}"
-                    )
-                    # Списуємо, або ставимо 0
-                    product_size.stock = max(0, product_size.stock - item.quantity)
-                    product_size.save()
-        # Якщо замовлення не знайдено
-        except Order.DoesNotExist:
-            return HttpResponse(status=400)
+    # Подія лише зберігається (повторна доставка відкидається по event id),
+    # обробляє її process_stripe_events, тож відповідь Stripe не чекає на замовлення й склад.
+    # StripeObject не має dict-методів, тож зберігаємо звичайний dict
+    StripeEvent.objects.receive(event.to_dict())
 
     # Якщо все ок
     return HttpResponse(status=200)
 
 
-# Якщо оплата була вдалою
+# Якщо оплата була вдалою. Замовлення шукаємо за id сесії у себе, без запиту до Stripe;
+# статус оплати виставить вебхук. Кошик очищається лише власнику замовлення
+@login_required(login_url="/users/login")
 def stripe_success(request):
     session_id = request.GET.get("session_id")
     if session_id:
-        try:
-            session = stripe.checkout.Session.retrieve(session_id)
-            order_id = session.metadata.get("order_id")
-            order = get_object_or_404(Order, id=order_id)
+        order = get_object_or_404(
+            Order, stripe_session_id=session_id, user=request.user
+        )
 
-            cart = CartMixin().get_cart(request)
-            cart.clear()
+        cart = CartMixin().get_cart(request)
+        cart.clear()
 
-            context = {"order": order}
-            if request.headers.get("HX-Request"):
-                return TemplateResponse(
-                    request, "payment/stripe_success_content.html", context
-                )
-            return render(request, "payment/stripe_success.html", context)
-        except Exception as e:
-            raise
+        context = {"order": order}
+        if request.headers.get("HX-Request"):
+            return TemplateResponse(
+                request, "payment/stripe_success_content.html", context
+            )
+        return render(request, "payment/stripe_success.html", context)
     return redirect("main:index")
 
 
-# Якщо оплата була не вдалою
+# Якщо оплата була не вдалою. Скасувати можна лише власне неоплачене замовлення;
+# save() запускає сигнал, який звільняє резерв товару
+@login_required(login_url="/users/login")
 def stripe_cancel(request):
     order_id = request.GET.get("order_id")
     if order_id:
-        order = get_object_or_404(Order, id=order_id)
-        order.status = "cancelled"
-        order.save()
+        order = get_object_or_404(Order, id=order_id, user=request.user)
+        if order.status == "pending":
+            order.status = "cancelled"
+            order.save()
         context = {"order": order}
         if request.headers.get("HX-Request"):
             return TemplateResponse(
@@ -0,0 +1,44 @@
+import logging
+
+from django.utils import timezone
+from orders.models import Order
+
+logger = logging.getLogger(__name__)
+
+
+# Оплата пройшла: замовлення переходить у processing, товар списується зі stock
+def checkout_session_completed(event):
+    session = event["data"]["object"]
+    order_id = session.get("metadata", {}).get("order_id")
+    if not Order.objects.filter(id=order_id).exists():
+        # Подію буде оброблено повторно пізніше
+        raise Order.DoesNotExist(f"Order {order_id} not found")
+
+    # Умовне оновлення статусу: вже оплачене замовлення вдруге не списується
+    paid = Order.objects.filter(
+        id=order_id, status__in=("pending", "cancelled")
+    ).update(
+        status="processing",
+        stripe_payment_intent_id=session.get("payment_intent"),
+        updated_at=timezone.now(),
+    )
+    if paid:
+        short = Order(id=order_id).deduct_stock()
+        if short:
+            # Хтось купив товару більше, ніж було: deduct_stock позначив замовлення
+            # для ручного розбору
+            logger.error(
+                "Order %s is oversold: not enough stock for sizes %s", order_id, short
+            )
+
+
+HANDLERS = {
+    "checkout.session.completed": checkout_session_completed,
+}
+
+
+# event — payload збереженої StripeEvent. Події без обробника просто позначаються обробленими
+def handle_event(event):
+    handler = HANDLERS.get(event["type"])
+    if handler is not None:
+        handler(event)